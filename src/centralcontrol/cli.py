@@ -4,9 +4,8 @@
 # written by grey@christoforo.net
 
 import central_control # for __version__
-from central_control.fabric import fabric
-from central_control.pcb import pcb
-import central_control.virt as virt
+# fabric, pcb and virt pull in numpy, scipy and the instrument drivers,
+# so they get imported in run() to keep --help and arg errors snappy
 
 import sys
 import argparse
@@ -16,8 +15,8 @@ import distutils.util
 
 import appdirs
 import configparser
+import re
 import ast
-import pathlib
 import inspect
 
 import xmlrpc.client  # here's how we get measurement data out as it's collected
@@ -27,6 +26,40 @@ from collections import deque
 # for updating prefrences
 prefs = {} # TODO: figure out how to un-global this
 
+# prefs.ini is just flat key = value sections, no interpolation or multiline values,
+# so these regexes are all we need to read it (much cheaper than configparser)
+_ini_section_re = re.compile(r'^\[([^\]]+)\][ \t]*$', re.M)
+_ini_option_re = re.compile(r'^([^#;=:\s][^=:\n]*?)[ \t]*[=:][ \t]*(.*?)[ \t]*$', re.M)
+
+def _fast_read_prefs(path):
+  """reads an ini file into a {section: {key: value}} dict of strings"""
+  try:
+    with open(path, 'r') as f:
+      text = f.read()
+  except FileNotFoundError:
+    return {}
+  sections = {}
+  pieces = _ini_section_re.split(text)
+  for name, body in zip(pieces[1::2], pieces[2::2]):
+    section = sections.setdefault(name, {})
+    for key, val in _ini_option_re.findall(body):
+      section[key.lower()] = val  # lower case keys like configparser does
+  return sections
+
+def _fast_write_prefs(path, sections):
+  """writes a {section: {key: value}} dict out as an ini file"""
+  chunks = []
+  for name, section in sections.items():
+    chunks.append(f"[{name}]\n" + "".join(f"{key} = {val}\n" for key, val in section.items()))
+  with open(path, 'w') as configfile:
+    configfile.write("\n".join(chunks))
+
+# the usual visa terminators, so we don't have to hex decode them
+_terminators = {'0A': '\n', '0D': '\r', '0D0A': '\r\n'}
+
+# pixel numbers enabled by each possible bitmask byte, leftmost bit is pixel one
+_byte_pixels = [tuple(str(i+1) for i in range(8) if byte & (128 >> i)) for byte in range(256)]
+
 class cli:
   """the command line interface"""
   appname = 'central_control'
@@ -38,9 +71,9 @@ class cli:
   # for correct system-wide install
   system_layouts_file_fullpath = sys.prefix + os.path.sep + 'etc' + os.path.sep + layouts_file_name
   # for weird windows anaconda setup.py install 
-  module_layouts_file_fullpath = os.path.split(os.path.split(inspect.getfile(fabric))[0])[0] + os.path.sep + 'etc' + os.path.sep + layouts_file_name
+  module_layouts_file_fullpath = os.path.split(os.path.split(inspect.getfile(central_control))[0])[0] + os.path.sep + 'etc' + os.path.sep + layouts_file_name
   # if running from source
-  source_layouts_file_fullpath = os.path.split(os.path.split(inspect.getfile(fabric))[0])[0] + os.path.sep + 'config' + os.path.sep + layouts_file_name
+  source_layouts_file_fullpath = os.path.split(os.path.split(inspect.getfile(central_control))[0])[0] + os.path.sep + 'config' + os.path.sep + layouts_file_name
 
   
   layouts_file_used = None
@@ -68,41 +101,42 @@ class cli:
     self.args = self.get_args()
     
     # for saving config
-    config_path = pathlib.Path(self.config_file_fullpath)
-    config_path.parent.mkdir(parents = True, exist_ok = True)
-    config = configparser.ConfigParser()
-    config.read(self.config_file_fullpath)
-    
-    # take command line args and put them in to prefrences
-    if self.config_section not in config:
-      config[self.config_section] = prefs
+    os.makedirs(os.path.dirname(self.config_file_fullpath), exist_ok=True)
+    config = _fast_read_prefs(self.config_file_fullpath)
+    if self.config_section in config:
+      saved_prefs = dict(config[self.config_section])  # a copy, the merge below edits the section in place
     else:
-      for key, val in prefs.items():
-        config[self.config_section][key] = str(val)
+      saved_prefs = None
     
-    # save the prefrences file
-    with open(self.config_file_fullpath, 'w') as configfile:
-      config.write(configfile)
+    # take command line args and put them in to prefrences
+    these_prefs = config.setdefault(self.config_section, {})
+    for key, val in prefs.items():
+      these_prefs[key] = str(val)
     
-    # now read back the new prefs
-    config.read(self.config_file_fullpath)
+    # save the prefrences file, but only if the command line changed something
+    # and this isn't just a dummy/scan/hardware test run
+    # the in-memory config is already what we'd read back, so there's no need to re-read it
+    testing_run = self.args.dummy or self.args.scan or self.args.test_hardware
+    if (these_prefs != saved_prefs) and not testing_run:
+      _fast_write_prefs(self.config_file_fullpath, config)
     
     # TODO: display to user what args are being taken from the command line,
     # and which ones are being taken from the saved prefrences file
     
     # apply prefrences to argparse
-    for key, val in config[self.config_section].items():
+    for key, val in these_prefs.items():
+      if key in prefs:
+        continue  # argparse already gave us this one, properly typed
       if type(self.args.__getattribute__(key)) == int:
-        self.args.__setattr__(key, config.getint(self.config_section, key))
+        self.args.__setattr__(key, int(val))
       elif type(self.args.__getattribute__(key)) == float:
-        self.args.__setattr__(key, config.getfloat(self.config_section, key))
+        self.args.__setattr__(key, float(val))
       elif type(self.args.__getattribute__(key)) == bool:
-        self.args.__setattr__(key, config.getboolean(self.config_section, key))
+        self.args.__setattr__(key, bool(distutils.util.strtobool(val)))
       elif type(self.args.__getattribute__(key)) == list or type(self.args.__getattribute__(key)) == tuple:
-        v = config.get(self.config_section, key)
-        self.args.__setattr__(key, ast.literal_eval(v))
+        self.args.__setattr__(key, ast.literal_eval(val))
       else:
-        self.args.__setattr__(key, config.get(self.config_section, key))
+        self.args.__setattr__(key, val)
 
     # layouts.ini file search order: 1=cwd, 2=source/config, 3=sys.prefix, 4=central_control.__path__
     cwd_layouts_file_fullpath = os.getcwd() + os.path.sep + self.layouts_file_name
@@ -143,7 +177,10 @@ class cli:
     if 'ARCHIVE' in config:
       self.archive_address = config['ARCHIVE']['address']  # an address string where to archive data to as we collect it, like "ftp://epozz:21/drop/"
 
-    self.args.sm_terminator = bytearray.fromhex(self.args.sm_terminator).decode()
+    sm_terminator = _terminators.get(self.args.sm_terminator.upper())
+    if sm_terminator is None:
+      sm_terminator = bytearray.fromhex(self.args.sm_terminator).decode()
+    self.args.sm_terminator = sm_terminator
     
     if self.args.light_address.upper() == 'NONE':
       self.args.light_address = None
@@ -173,6 +210,9 @@ class cli:
     Does the measurements
     """
     args = self.args
+    from central_control.fabric import fabric
+    from central_control.pcb import pcb
+    import central_control.virt as virt
 
     # create the control entity
     l = fabric(saveDir = args.destination, archive_address=self.archive_address)
@@ -240,14 +280,16 @@ class cli:
           d2_cal = intensity[1]
           print('Setting present intensity diode readings to be used as future 1.0 sun refrence values: [{:}, {:}]'.format(d1_cal, d2_cal))
           # save the newly read diode calibraion values to the prefs file
-          config = configparser.ConfigParser()
-          config.read(self.config_file_fullpath)
-          config[self.config_section]['diode_calibration_values'] = str([d1_cal, d2_cal])
-          with open(self.config_file_fullpath, 'w') as configfile:
-            config.write(configfile)
+          config = _fast_read_prefs(self.config_file_fullpath)
+          config.setdefault(self.config_section, {})['diode_calibration_values'] = str([d1_cal, d2_cal])
+          _fast_write_prefs(self.config_file_fullpath, config)
 
         if args.sweep or args.snaith or args.mppt > 0:
           last_substrate = None
+          # the overrides are the same for every pixel, so resolve them once up front
+          compliance_override = args.current_compliance_override if isinstance(args.current_compliance_override, float) else None
+          scan_high_override = args.scan_high_override if isinstance(args.scan_high_override, float) else None
+          scan_low_override = args.scan_low_override if isinstance(args.scan_low_override, float) else None
           # scan through the pixels and do the requested measurements
           for pixel in pixel_que:
             substrate = pixel[0][0].upper()
@@ -265,8 +307,8 @@ class cli:
             pixel_ready = l.pixelSetup(pixel, t_dwell_voc = args.t_prebias, voltage_compliance = args.voltage_compliance_override)  #  steady state Voc measured here
             if pixel_ready and substrate_ready:
               
-              if type(args.current_compliance_override) == float:
-                compliance = args.current_compliance_override
+              if compliance_override is not None:
+                compliance = compliance_override
               else:
                 compliance = l.compliance_guess  # we have to just guess what the current complaince should be here
                 # TODO: probably need the user to tell us when it's a dark scan to get the sensativity we need in that case
@@ -274,12 +316,12 @@ class cli:
                 
               if args.sweep:
                 # now sweep from Voc --> Isc
-                if type(args.scan_high_override) == float:
-                  start = args.scan_high_override
+                if scan_high_override is not None:
+                  start = scan_high_override
                 else:
                   start = l.Voc
-                if type(args.scan_low_override) == float:
-                  end = args.scan_low_override
+                if scan_low_override is not None:
+                  end = scan_low_override
                 else:
                   end = 0
         
@@ -290,8 +332,8 @@ class cli:
                 (Pmax_sweep, Vmpp, Impp, maxIndex) = l.mppt.register_curve(sv)
                 l.mppt.Vmpp = Vmpp
                 
-                if type(args.current_compliance_override) == float:
-                  compliance = args.current_compliance_override
+                if compliance_override is not None:
+                  compliance = compliance_override
                 else:
                   compliance = abs(sv[-1][1] * 2)  # take the last measurement*2 to be our compliance limit
                 l.mppt.current_compliance = compliance
@@ -304,8 +346,8 @@ class cli:
               l.f[l.position+'/'+l.pixel].attrs['Isc'] = l.Isc 
               l.mppt.Isc = l.Isc
               
-              if type(args.current_compliance_override) == float:
-                compliance = args.current_compliance_override
+              if compliance_override is not None:
+                compliance = compliance_override
               else:
                 # if the measured steady state Isc was below 5 microamps, set the compliance to 10uA (this is probaby a dark curve)
                 # we don't need the accuracy of the lowest current sense range (I think) and we'd rather have the compliance headroom
@@ -318,12 +360,12 @@ class cli:
           
               if args.snaith:
                 # "snaithing" is a sweep from Isc --> Voc * (1+ l.percent_beyond_voc)
-                if type(args.scan_low_override) == float:
-                  start = args.scan_low_override
+                if scan_low_override is not None:
+                  start = scan_low_override
                 else:
                   start = 0
-                if type(args.scan_high_override) == float:
-                  end = args.scan_high_override
+                if scan_high_override is not None:
+                  end = scan_high_override
                 else:
                   end = l.Voc * ((100 + l.percent_beyond_voc) / 100)
         
@@ -413,15 +455,12 @@ class cli:
     the leftmost bit is for pixel one
     """
     q = []
-    if pixel_address_string[0:2] == '0x':
+    if pixel_address_string.startswith('0x'):
       bitmask = bytearray.fromhex(pixel_address_string[2:])
       for substrate_index, byte in enumerate(bitmask):
         substrate = chr(substrate_index+ord('A'))
         if (substrate in self.l.pcb.substratesConnected): #  only put good pixels in the queue
-          for i in range(8):
-            mask =  128 >> i
-            if (byte & mask):
-              q.append(substrate+str(i+1))
+          q.extend(substrate+pixel for pixel in _byte_pixels[byte])
         else:
           print("WARNING! Substrate {:} could not be found".format(substrate))
     else:
@@ -487,7 +526,7 @@ class cli:
           final_element = (pxad, area, position, using_layouts[this_substrate]['name'])
           ret.append(final_element)
     
-    return deque(ret)
+    return ret
       
   
   def is_dir(self, dirname):
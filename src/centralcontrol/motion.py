@@ -9,7 +9,92 @@ if __name__ == "__main__" and __package__ in [None, '']:
 from .afms import afms
 from .us import us
 import json
-from urllib.parse import urlparse, parse_qs
+import numpy
+import re
+import threading
+import time
+from functools import lru_cache
+from urllib.parse import unquote_plus
+
+# scheme://location?key=value&key=value
+_address_re = re.compile(r"^(?P<scheme>[A-Za-z][A-Za-z0-9+.-]*)://(?P<location>[^?#]*)(?:\?(?P<query>[^#]*))?(?:#.*)?$")
+_query_re = re.compile(r"(?:^|&)(?P<key>[^&=]+)=(?P<value>[^&]+)")
+
+
+@lru_cache(maxsize=32)
+def _parse_address(address):
+  """
+  splits a motion controller address into its scheme, location and settings
+  the result is cached by address string because motion objects get built over and over with the same address
+  settings are returned as a tuple of (attribute name, value) pairs with immutable values (read-only arrays)
+  so the cache can't be corrupted
+  """
+  match = _address_re.match(address)
+  if match is None:
+    raise(ValueError(f"Incorrect motion controller address format: {address}"))
+  qparsed = {}
+  if match["query"] is not None:
+    for key, value in _query_re.findall(match["query"]):
+      qparsed.setdefault(unquote_plus(key), unquote_plus(value))  # first one wins
+  location = match["location"]
+  settings = {}
+  empty_koz = [-2, -2]  # a keepout zone that will never activate
+  if "el" in qparsed:
+    splitted = qparsed['el'].split(',')
+    settings["expected_lengths"] = numpy.array(splitted, dtype=numpy.float64)
+    settings["keepout_zones"] = numpy.array([empty_koz]*len(splitted), dtype=numpy.float64)  # ensure default koz works
+  if "spm" in qparsed:
+    settings["steps_per_mm"] = int(qparsed['spm'])
+  if "kz" in qparsed:
+    try:
+      zones = json.loads(qparsed['kz'])
+    except json.JSONDecodeError:
+      raise(ValueError(f"Malformed keepout zone list in motion controller address: {address}"))
+    try:
+      settings["keepout_zones"] = numpy.array([empty_koz if z == [] else z for z in zones], dtype=numpy.float64).reshape(-1, 2)
+    except ValueError:
+      raise(ValueError(f"Keepout zones must be [] or [lower, upper] pairs in motion controller address: {address}"))
+  if "hto" in qparsed:
+    settings["home_timeout"] = float(qparsed['hto'])
+  if "homer" in qparsed:
+    settings["home_procedure"] = qparsed['homer']
+  if "lf" in qparsed:
+    settings["allowed_length_deviation"] = float(qparsed['lf'])
+  for value in settings.values():
+    if isinstance(value, numpy.ndarray):
+      value.flags.writeable = False
+  return match["scheme"].lower(), location, tuple(settings.items())
+
+def _make_afms(mo, pcb_object):
+  """
+  builds the motion engine for afms:// addresses
+  """
+  if pcb_object is not None:
+    pass  #TODO: throw warning here if we detect a virtual PCB object because afms does not support this.
+  afms_setup = {}
+  afms_setup["location"] = mo.location
+  afms_setup["spm"] = mo.steps_per_mm
+  afms_setup["homer"] = mo.home_procedure
+  return afms(**afms_setup)
+
+def _make_us(mo, pcb_object):
+  """
+  builds the motion engine for us:// addresses
+  """
+  if mo.location != "controller":
+    raise(ValueError(f"Stage connection location unknown: {mo.location}"))
+  if pcb_object is None:
+    raise(ValueError(f"us:// protocol requires a pcb_object"))
+  us_setup = {}
+  us_setup["pcb_object"] = pcb_object
+  us_setup["spm"] = mo.steps_per_mm
+  if hasattr(pcb_object, 'is_virtual'):
+    if pcb_object.is_virtual == True:
+      pcb_object.prepare_virt_motion(spm=mo.steps_per_mm, el=mo.expected_lengths)
+  return us(**us_setup)
+
+# address scheme --> function(motion object, pcb object) that returns a motion engine
+_backends = {"afms": _make_afms, "us": _make_us}
 
 class motion:
   """
@@ -19,11 +104,12 @@ class motion:
   home_procedure = "default"
   home_timeout = 130  # seconds
   motion_timeout_fraction = 1/2  # fraction of home_timeout for movement timeouts
-  expected_lengths = [float("inf")]  # list of mm
+  expected_lengths = numpy.array([float("inf")])  # array of mm
   actual_lengths = [float("inf")]  # list of mm
-  keepout_zones = [[-2,-2]]  # list of lists of mm
+  keepout_zones = numpy.array([[-2.0, -2.0]])  # (axes, 2) array of [lower, upper] mm
   axes = [1]  # list of connected axis indicies
   allowed_length_deviation = 5 # measured length can deviate from expected length by up to this, in mm
+  position_cache_ttl = 0.005  # seconds a position read can be reused for before asking the controller again
   location = "controller"
 
   motor_steps_per_rev = 200  # steps/rev
@@ -37,59 +123,42 @@ class motion:
     """
     sets up communication to motion controller
     """
-    parsed = None
-    qparsed = None
-    try:
-      parsed = urlparse(address)
-      qparsed = parse_qs(parsed.query)
-    except Exception:
-      raise(ValueError("Incorrect motion controller address format: {address}"))
-    self.location = parsed.netloc + parsed.path
-    empty_koz = [-2, -2]  # a keepout zone that will never activate
-    if "el" in qparsed:
-      splitted = qparsed['el'][0].split(',')
-      self.expected_lengths = [float(y) for y in splitted]
-      self.keepout_zones = []
-      for i, l in enumerate(self.expected_lengths):  # ensure default koz works
-        self.keepout_zones.append(empty_koz)
-    if "spm" in qparsed:
-      self.steps_per_mm = int(qparsed['spm'][0])
-    if "kz" in qparsed:
-      self.keepout_zones = json.loads(qparsed['kz'][0])
-      for i, z in enumerate(self.keepout_zones):
-        if z == []:
-          self.keepout_zones[i] = empty_koz
-    if "hto" in qparsed:
-      self.home_timeout = float(qparsed['hto'][0])
-    if "homer" in qparsed:
-      self.home_procedure = qparsed['homer'][0]
-    if "lf" in qparsed:
-      self.allowed_length_deviation = float(qparsed['lf'][0])
-
-    if parsed.scheme =='afms':
-      if pcb_object is not None:
-        pass  #TODO: throw warning here if we detect a virtual PCB object because afms does not support this.
-      afms_setup = {}
-      afms_setup["location"] = self.location
-      afms_setup["spm"] = self.steps_per_mm
-      afms_setup["homer"] = self.home_procedure
-      self.motion_engine = afms(**afms_setup)
-    elif parsed.scheme == 'us':
-      if self.location != "controller":
-        raise(ValueError(f"Stage connection location unknown: {self.location}"))
-      else:
-        if pcb_object is None:
-          raise(ValueError(f"us:// protocol requires a pcb_object"))
-        else:
-          us_setup = {}
-          us_setup["pcb_object"] = pcb_object
-          us_setup["spm"] = self.steps_per_mm
-          if hasattr(pcb_object, 'is_virtual'):
-            if pcb_object.is_virtual == True:
-              pcb_object.prepare_virt_motion(spm=self.steps_per_mm, el=self.expected_lengths)
-          self.motion_engine = us(**us_setup)
-    else:
-      raise(ValueError(f"Unexpected motion controller protocol {self.scheme} in {address}"))
+    scheme, self.location, settings = _parse_address(address)
+    for name, value in settings:
+      setattr(self, name, value)
+
+    factory = _backends.get(scheme)
+    if factory is None:
+      raise(ValueError(f"Unexpected motion controller protocol {scheme} in {address}"))
+    self.motion_engine = factory(self, pcb_object)
+
+    self._pos_cache = None
+    self._pos_ts = 0
+    self._pos_dirty = True
+    self._motion_thread = None
+    self._motion_result = None
+    self._motion_error = None
+
+  def __getattr__(self, name):
+    """
+    anything motion doesn't define itself (close(), end_buffers...) comes from the motion engine
+    engine methods get memoized on the instance so later lookups are plain instance attribute hits
+    data attributes aren't memoized because the engine keeps them up to date
+    """
+    engine = self.__dict__.get("motion_engine")
+    if (engine is None) or name.startswith("__"):
+      raise(AttributeError(f"'{type(self).__name__}' object has no attribute '{name}'"))
+    attr = getattr(engine, name)
+    if callable(attr):
+      setattr(self, name, attr)
+    return attr
+
+  @classmethod
+  def register_backend(cls, scheme, factory):
+    """
+    makes addresses starting with scheme:// use the motion engine returned by factory(motion_object, pcb_object)
+    """
+    _backends[scheme.lower()] = factory
 
   def connect(self):
     """
@@ -118,44 +187,100 @@ class motion:
 
     return result
 
-#  def move(self, mm):
-#    """
-#    moves mm mm direction, blocking, returns 0 on successful movement
-#    """
-#    return self.motion_engine.move(mm)
-
   def goto(self, pos, timeout=None):
     """
     goes to an absolute mm position, blocking, reuturns 0 on success
     """
     if timeout == None:
       timeout = self.home_timeout*self.motion_timeout_fraction
+    pos = self._check_goal(pos)
+    self._pos_dirty = True
+    goto_result = self.motion_engine.goto(pos, timeout=timeout)
+    self._pos_dirty = True
+    return goto_result
+
+  def start_goto(self, pos, timeout=None):
+    """
+    starts going to an absolute mm position and returns right away, call wait() to block until it's done
+    the goal is checked against the stage limits before this returns
+    """
+    if self.busy():
+      raise(ValueError("Error: Can not start a new movement while the previous one is still in progress"))
+    if timeout == None:
+      timeout = self.home_timeout*self.motion_timeout_fraction
+    pos = self._check_goal(pos)
+    self._motion_result = None
+    self._motion_error = None
+    self._pos_dirty = True
+    self._motion_thread = threading.Thread(target=self._background_goto, args=(pos, timeout), daemon=True)
+    self._motion_thread.start()
+
+  def _background_goto(self, pos, timeout):
+    try:
+      self._motion_result = self.motion_engine.goto(pos, timeout=timeout)
+    except Exception as e:
+      self._motion_error = e
+    self._pos_dirty = True
+
+  def busy(self):
+    """
+    returns True while a movement started with start_goto() is still in progress
+    """
+    return (self._motion_thread is not None) and self._motion_thread.is_alive()
+
+  def wait(self, timeout=None):
+    """
+    blocks until a movement started with start_goto() is finished, returns what goto() would have
+    errors from the movement are raised here
+    """
+    if self._motion_thread is None:
+      return self._motion_result
+    self._motion_thread.join(timeout=timeout)
+    if self._motion_thread.is_alive():
+      raise(ValueError(f"Timeout while waiting for the stage to finish moving. The limit was {timeout} [s]"))
+    self._motion_thread = None
+    if self._motion_error is not None:
+      error = self._motion_error
+      self._motion_error = None
+      raise(error)
+    return self._motion_result
+
+  def _check_goal(self, pos):
+    """
+    makes sure an absolute mm position can be gone to, returns it as a list
+    """
     if not hasattr(pos, "__len__"):
       pos = [pos]
     naxes = len(self.axes)
     npos = len(pos)
     if naxes != npos:
       raise(ValueError(f"Error: axis count mismatch. Found {npos} commanded positions, but the hardware reports {naxes} axes"))
-    for i, a in enumerate(self.axes):
-      el = self.expected_lengths[i]
-      al = self.actual_lengths[i]
-      ko_lower = self.keepout_zones[i][0]
-      ko_upper = self.keepout_zones[i][1]
-      lower_lim = 0 + self.motion_engine.end_buffers
-      upper_lim = al - self.motion_engine.end_buffers
+
+    # check every axis at once, then only walk the axes to build an error message if something failed
+    goals = numpy.asarray(pos, dtype=numpy.float64)
+    el = numpy.asarray(self.expected_lengths, dtype=numpy.float64)
+    al = numpy.asarray(self.actual_lengths, dtype=numpy.float64)
+    ko_lower = self.keepout_zones[:, 0]
+    ko_upper = self.keepout_zones[:, 1]
+    lower_lim = 0 + self.motion_engine.end_buffers
+    upper_lim = al - self.motion_engine.end_buffers
+    bad_length = (el < float("inf")) & (numpy.abs(el - al) > self.allowed_length_deviation)  # length check is enabled for finite el
+    in_keepout = (goals >= ko_lower) & (goals <= ko_upper)
+    too_low = goals < lower_lim
+    too_high = goals > upper_lim
+    failed = bad_length | in_keepout | too_low | too_high
+    if failed.any():
+      i = int(numpy.argmax(failed))
+      a = self.axes[i]
       goal = pos[i]
-      if el < float("inf"):  # length check is enabled
-        delta = el - al
-        if abs(delta) > self.allowed_length_deviation:
-          raise(ValueError(f"Error: Unexpected axis {a} length. Found {al} [mm] but expected {el} [mm]"))
-      if (goal >= ko_lower) and (goal <= ko_upper):
-        raise(ValueError(f"Error: Axis {a} requested position, {goal} [mm], falls within keepout zone: [{ko_lower}, {ko_upper}] [mm]"))
-      if goal < lower_lim:
+      if bad_length[i]:
+        raise(ValueError(f"Error: Unexpected axis {a} length. Found {al[i]} [mm] but expected {el[i]} [mm]"))
+      if in_keepout[i]:
+        raise(ValueError(f"Error: Axis {a} requested position, {goal} [mm], falls within keepout zone: [{ko_lower[i]}, {ko_upper[i]}] [mm]"))
+      if too_low[i]:
         raise(ValueError(f"Error: Attempt to move axis {a} outside of limits. Attempt: {goal} [mm], but Minimum: {lower_lim} [mm]"))
-      if goal > upper_lim:
-        raise(ValueError(f"Error: Attempt to move axis {a} outside of limits. Attempt: {goal} [mm], but Maximum: {upper_lim} [mm]"))
-    goto_result = self.motion_engine.goto(pos, timeout=timeout)
-    return goto_result
+      raise(ValueError(f"Error: Attempt to move axis {a} outside of limits. Attempt: {goal} [mm], but Maximum: {upper_lim[i]} [mm]"))
+    return pos
 
   def home(self, timeout=None):
     """
@@ -168,20 +293,48 @@ class motion:
     home_setup["timeout"] = timeout
     home_setup["expected_lengths"] = self.expected_lengths
     home_setup["allowed_deviation"] = self.allowed_length_deviation
+    self._pos_dirty = True
     home_result = self.motion_engine.home(**home_setup)
+    self._pos_dirty = True
     self.actual_lengths = self.motion_engine.len_axes_mm
 
   def estop(self):
     """
     emergency stop of the driver
     """
+    self._pos_dirty = True
     return self.motion_engine.estop()
 
+  def invalidate_position(self):
+    """
+    forces the next get_position() call to read from the controller
+    """
+    self._pos_dirty = True
+
   def get_position(self):
     """
     returns the current stage location in mm
+    back-to-back calls within position_cache_ttl of each other (with no motion commanded in between)
+    reuse the last reading instead of going out to the controller again
+    """
+    now = time.monotonic()
+    if self._pos_dirty or ((now - self._pos_ts) >= self.position_cache_ttl):
+      self._pos_cache = self.motion_engine.get_position()
+      self._pos_ts = now
+      self._pos_dirty = False
+    return list(self._pos_cache)
+
+  def get_status(self):
+    """
+    returns a MotionStatus snapshot (positions, lengths, busy and homed flags) of all axes from one pass
+    also refreshes the position cache when every axis reported a position
     """
-    return self.motion_engine.get_position()
+    status = self.motion_engine.get_status()
+    if None not in status.pos:
+      self._pos_cache = status.pos
+      self._pos_ts = time.monotonic()
+      self._pos_dirty = self.busy()
+    return status
 
 # testing
 def main():
@@ -246,9 +399,9 @@ def main():
     del dancepoints_rev[-1]
     full_dancelist = dancepoints + dancepoints_rev
 
-    t0 = time.time()
+    t0 = time.monotonic()
     target = here
-    while ((time.time() - t0) < goto_dance_duration):
+    while ((time.monotonic() - t0) < goto_dance_duration):
       goal = full_dancelist.pop(0)
       target[dance_axis] = goal
       print(f"New target = {target}")
@@ -1,8 +1,18 @@
 import numpy
+import math
 import time
 import random
 from collections import deque
 
+def _iv_angle(i, v, Voc, Isc):
+  """
+  degrees(arctan(i/v*Voc/Isc)) on scalars, without numpy ufunc dispatch
+  atan2 with the sign of the denominator folded into the numerator gives the same
+  (-90, 90] branch as arctan and doesn't divide by zero at v=0
+  """
+  x = v * Isc
+  return math.degrees(math.atan2(math.copysign(1, x) * i * Voc, abs(x)))
+
 class mppt:
   """
   Maximum power point tracker class
@@ -307,21 +317,32 @@ class mppt:
     run_time = time.time() - self.t0
     while (not self.abort and (run_time < duration)):
       print("Exploring for new Mpp...")
-      i_explore = numpy.array(Impp)
-      v_explore = numpy.array(Vmpp)
-
-      angleMpp = numpy.rad2deg(numpy.arctan(Impp/Vmpp*Voc/Isc))
+      # one sweep up to Voc and back down to 0V is at most 2*Voc/|dV| steps
+      n_explore = 2 * int(abs(Voc / dV)) + 8
+      i_explore = numpy.empty(n_explore)
+      v_explore = numpy.empty(n_explore)
+      i_explore[0] = Impp
+      v_explore[0] = Vmpp
+      k = 1
+
+      angleMpp = _iv_angle(Impp, Vmpp, Voc, Isc)
       print('MPP ANGLE = {:0.2f}'.format(angleMpp))
       v_set = Vmpp
       highEdgeTouched = False
       lowEdgeTouched = False
+      measure = self.measure  # bound once for the explore steps
+      t0 = self.t0
       while (not self.abort and not(highEdgeTouched and lowEdgeTouched)):
-        (v, i, t) = self.measure(v_set, callback=callback)
-        run_time = t - self.t0
-
-        i_explore = numpy.append(i_explore, i)
-        v_explore = numpy.append(v_explore, v)
-        thisAngle = numpy.rad2deg(numpy.arctan(i/v*Voc/Isc))
+        (v, i, t) = measure(v_set, callback=callback)
+        run_time = t - t0
+
+        if k == len(v_explore):  # ran out of room, double it
+          i_explore = numpy.concatenate((i_explore, numpy.empty(k)))
+          v_explore = numpy.concatenate((v_explore, numpy.empty(k)))
+        i_explore[k] = i
+        v_explore[k] = v
+        k += 1
+        thisAngle = _iv_angle(i, v, Voc, Isc)
         dAngle = angleMpp - thisAngle
         # print("dAngle={:}, highEdgeTouched={:}, lowEdgeTouched={:}".format(dAngle, highEdgeTouched, lowEdgeTouched))
         
@@ -367,14 +388,17 @@ class mppt:
       print("Done exploring.")
 
       # find the powers for the values we just explored
-      p_explore = v_explore * i_explore * -1
-      maxIndex = numpy.argmax(p_explore)
+      v_explore = v_explore[:k]
+      i_explore = i_explore[:k]
+      # power out is -v*i, so its max is the min of v*i
+      p_explore = v_explore * i_explore
+      maxIndex = numpy.argmin(p_explore)
       Vmpp = v_explore[maxIndex]
       Impp = i_explore[maxIndex]
 
-      print("New Mpp found: {:.6f} mW @ {:.6f} V".format(p_explore[maxIndex]*1000, Vmpp))
+      print("New Mpp found: {:.6f} mW @ {:.6f} V".format(-p_explore[maxIndex]*1000, Vmpp))
 
-      dFromLastMppAngle = angleMpp - numpy.rad2deg(numpy.arctan(Impp/Vmpp*Voc/Isc))
+      dFromLastMppAngle = angleMpp - _iv_angle(Impp, Vmpp, Voc, Isc)
 
       print("That's {:.6f} degrees different from the previous Mpp.".format(dFromLastMppAngle))
       
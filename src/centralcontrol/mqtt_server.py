@@ -11,22 +11,32 @@ if __name__ == "__main__" and (__package__ is None or __package__ == ""):
     sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
 
 import argparse
+import atexit
 import collections
+import contextlib
 import multiprocessing
 import os
 import pickle
 import queue
 import signal
+import sys
 import time
 import traceback
 import uuid
 
+import numpy as np
 import paho.mqtt.client as mqtt
 import paho.mqtt.publish as publish
 
 from mqtt_tools.queue_publisher import MQTTQueuePublisher
 from .fabric import fabric
 
+# constant payloads are pickled once rather than on every publish
+_READY = pickle.dumps("Ready")
+_BUSY = pickle.dumps("Busy")
+_OFFLINE = pickle.dumps("Offline")
+_CLEAR = pickle.dumps("")
+
 def get_args():
     """Get arguments parsed from the command line."""
     parser = argparse.ArgumentParser()
@@ -38,63 +48,209 @@ def get_args():
     return parser.parse_args()
 
 
-def start_process(cli_args, process, target, args):
-    """Start a new process to perform an action if no process is running.
+def _worker(tasks, idle, cancel):
+    """Run actions one at a time in a long-lived process.
+
+    SIGINT is ignored everywhere except while an action is running, so a stop
+    request can only ever interrupt the action itself.
+
+    Parameters
+    ----------
+    tasks : multiprocessing.Queue
+        Queue of (target, args) tuples to run.
+    idle : multiprocessing.Event
+        Set whenever the worker has finished an action and is waiting for the next.
+    cancel : multiprocessing.Event
+        Set when a stop was requested, so a queued action that hasn't started yet
+        gets skipped.
+    """
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    # multiprocessing children skip atexit, so turn terminate() into a normal exit
+    # and close the shared publisher ourselves on the way out
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit())
+    try:
+        while True:
+            try:
+                target, args = tasks.get()
+                signal.signal(signal.SIGINT, signal.default_int_handler)
+                try:
+                    # checked after the handler is back so a stop can't slip between
+                    if cancel.is_set() == False:
+                        target(*args)
+                finally:
+                    signal.signal(signal.SIGINT, signal.SIG_IGN)
+            except KeyboardInterrupt:
+                # stop requested and the action didn't handle it itself
+                pass
+            except Exception:
+                traceback.print_exc()
+            finally:
+                # in case the interrupt landed before the inner finally could run
+                signal.signal(signal.SIGINT, signal.SIG_IGN)
+                idle.set()
+    finally:
+        _close_publisher()
+
+
+class ActionWorker:
+    """Persistent worker process that performs actions requiring instrument I/O.
+
+    Forking a fresh interpreter for every request costs far more than the short
+    actions it runs, so one worker is kept warm and fed through a queue.
+    """
+
+    def __init__(self):
+        """Construct and start the worker."""
+        self.process = None
+        self.start()
+
+    def start(self):
+        """(Re)spawn the worker process with a fresh queue and flags."""
+        self.tasks = multiprocessing.Queue()
+        self.idle = multiprocessing.Event()
+        self.idle.set()
+        self.cancel = multiprocessing.Event()
+        self.process = multiprocessing.Process(
+            target=_worker, args=(self.tasks, self.idle, self.cancel), daemon=True
+        )
+        self.process.start()
+
+    def busy(self):
+        """Check whether the worker is running an action.
+
+        Returns
+        -------
+        busy : bool
+            True if an action is in progress.
+        """
+        return self.process.is_alive() and not self.idle.is_set()
+
+    def submit(self, target, args):
+        """Queue an action for the worker.
+
+        Parameters
+        ----------
+        target : function handle
+            Function to run in the worker process.
+        args : tuple
+            Arguments required by the function.
+        """
+        if self.process.is_alive() == False:
+            self.start()
+        self.cancel.clear()
+        self.idle.clear()
+        self.tasks.put((target, args))
+
+    def interrupt(self):
+        """Interrupt the running action and wait for the worker to become idle.
+
+        An action that is still queued is skipped rather than interrupted.
+        """
+        self.cancel.set()
+        os.kill(self.process.pid, signal.SIGINT)
+        while self.idle.wait(timeout=1) == False:
+            if self.process.is_alive() == False:
+                break
+
+
+def start_process(cli_args, worker, target, args):
+    """Start an action in the worker if it's not already busy.
 
     Parameters
     ----------
+    worker : ActionWorker
+        Worker that runs the action.
     target : function handle
-        Function to run in child process.
+        Function to run in the worker process.
     args : tuple
         Arguments required by the function.
     """
 
-    if process.is_alive() == False:
-        ret_proc = multiprocessing.Process(target=target, args=args)
-        ret_proc.start()
+    if worker.busy() == False:
+        worker.submit(target, args)
         publish.single(
             "measurement/status",
-            pickle.dumps("Busy"),
+            _BUSY,
             qos=2,
             retain=True,
             hostname=cli_args.mqtthost,
         )
     else:
-        ret_proc = process
         payload = {"level": 30, "msg": "Measurement server busy!"}
-        publish.single("measurement/log", pickle.dumps(payload), qos=2, hostname=cli_args.mqtthost)
+        publish.single("measurement/log", pickle.dumps(payload), qos=0, hostname=cli_args.mqtthost)
 
-    return ret_proc
+    return worker
 
 
-def stop_process(cli_args, process):
-    """Stop a running process."""
+def stop_process(cli_args, worker):
+    """Stop a running action."""
 
-    if process.is_alive() == True:
-        os.kill(process.pid, signal.SIGINT)
-        process.join()
-        print(f"Process still alive?: {process.is_alive()}")
+    if worker.busy() == True:
+        worker.interrupt()
+        print(f"Worker still busy?: {worker.busy()}")
         payload = {
             "level": 20,
             "msg": "Request to stop completed!",
         }
-        publish.single(
-            "measurement/log", pickle.dumps(payload), qos=2, hostname=cli_args.mqtthost
-        )
-        publish.single(
-            "measurement/status",
-            pickle.dumps("Ready"),
-            qos=2,
-            retain=True,
-            hostname=cli_args.mqtthost,
-        )
+        # send log and status over a single broker connection
+        msgs = [
+            {"topic": "measurement/log", "payload": pickle.dumps(payload), "qos": 0},
+            {
+                "topic": "measurement/status",
+                "payload": _READY,
+                "qos": 2,
+                "retain": True,
+            },
+        ]
+        publish.multiple(msgs, hostname=cli_args.mqtthost)
     else:
         payload = {
             "level": 30,
             "msg": "Nothing to stop. Measurement server is idle.",
         }
-        publish.single("measurement/log", pickle.dumps(payload), qos=2, hostname=cli_args.mqtthost)
-    return process
+        publish.single("measurement/log", pickle.dumps(payload), qos=0, hostname=cli_args.mqtthost)
+    return worker
+
+
+# MQTT publisher shared by every action run in this process, and the exit stack
+# that drains and disconnects it when the process is done with it
+_mqttqp = None
+_mqttqp_stack = contextlib.ExitStack()
+
+
+def _get_publisher(mqtthost):
+    """Get this process's persistent MQTT queue publisher.
+
+    The connection is made on first use and then kept open, so actions run by the
+    worker don't each pay for a new broker connection. It is only drained and
+    disconnected by `_close_publisher`, which runs at exit (or when the worker
+    process shuts down).
+
+    Parameters
+    ----------
+    mqtthost : str
+        MQTT broker IP address or hostname.
+
+    Returns
+    -------
+    mqttqp : MQTTQueuePublisher
+        Connected MQTT queue publisher.
+    """
+    global _mqttqp
+    if _mqttqp is None:
+        _mqttqp = _mqttqp_stack.enter_context(MQTTQueuePublisher())
+        _mqttqp.connect(mqtthost)
+        _mqttqp.loop_start()
+        atexit.register(_close_publisher)
+    return _mqttqp
+
+
+def _close_publisher():
+    """Publish anything still queued and disconnect the persistent MQTT publisher."""
+    global _mqttqp
+    if _mqttqp is not None:
+        _mqttqp = None
+        _mqttqp_stack.close()
 
 
 def _calibrate_eqe(request, mqtthost):
@@ -111,63 +267,64 @@ def _calibrate_eqe(request, mqtthost):
     """
     print("calibrating eqe...")
 
-    with MQTTQueuePublisher() as mqttc:
-        # catch all errors and report back to log
-        mqttc.connect(mqtthost)
-        mqttc.loop_start()
-
-        try:
-            with fabric() as measurement:
-                measurement.current_limit = request["config"]["smu"]["current_limit"]
-                # create temporary mqtt client
-                _log("Calibrating EQE...", 20, mqttc)
+    mqttc = _get_publisher(mqtthost)
+    measurement = fabric()
+    # catch all errors and report back to log
+    try:
+        with measurement:
+            measurement.current_limit = request["config"]["smu"]["current_limit"]
+            # create temporary mqtt client
+            _log("Calibrating EQE...", 20, mqttc)
 
-                args = request["args"]
+            args = request["args"]
 
-                # get pixel queue
-                if 'EQE_stuff' in args:
-                    pixel_queue = _build_q(request, experiment="eqe")
+            # get pixel queue
+            if 'EQE_stuff' in args:
+                pixel_queue = _build_q(request, experiment="eqe")
 
-                    if len(pixel_queue) > 1:
-                        _log(
-                            "Only one diode can be calibrated at a time but "
-                            + f"{len(pixel_queue)} were given. Only the first diode will be"
-                            + " measured.",
-                            30,
-                            mqttc,
-                        )
+                if len(pixel_queue) > 1:
+                    _log(
+                        "Only one diode can be calibrated at a time but "
+                        + f"{len(pixel_queue)} were given. Only the first diode will be"
+                        + " measured.",
+                        30,
+                        mqttc,
+                    )
 
-                        # only take first pixel for a calibration
-                        pixel_dict = pixel_queue[0]
-                        pixel_queue = collections.deque(maxlen=1)
-                        pixel_queue.append(pixel_dict)
-                else:
-                    # if it's emptpy, assume cal diode is connected externally
-                    pixel_dict = {
-                        "label": "external",
-                        "layout": None,
-                        "sub_name": None,
-                        "pixel": 0,
-                        "pos": None,
-                        "area": None,
-                    }
-                    pixel_queue = collections.deque()
+                    # only take first pixel for a calibration
+                    pixel_dict = pixel_queue[0]
+                    pixel_queue = collections.deque(maxlen=1)
                     pixel_queue.append(pixel_dict)
-
-                _eqe(pixel_queue, request, measurement, mqttc, calibration=True)
-
-                _log("EQE calibration complete!", 20, mqttc)
-
-            print("EQE calibration finished.")
-        except KeyboardInterrupt:
-            pass
-        except Exception as e:
-            traceback.print_exc()
-            _log(f"EQE CALIBRATION ABORTED! " + str(e), 40, mqttc)
-
-        mqttc.append_payload(
-            "measurement/status", pickle.dumps("Ready"), retain=True,
-        )
+            else:
+                # if it's emptpy, assume cal diode is connected externally
+                pixel_dict = {
+                    "label": "external",
+                    "layout": None,
+                    "sub_name": None,
+                    "pixel": 0,
+                    "pos": None,
+                    "area": None,
+                }
+                pixel_queue = collections.deque()
+                pixel_queue.append(pixel_dict)
+
+            _eqe(pixel_queue, request, measurement, mqttc, calibration=True)
+
+            _log("EQE calibration complete!", 20, mqttc)
+
+        print("EQE calibration finished.")
+    except KeyboardInterrupt:
+        pass
+    except Exception as e:
+        traceback.print_exc()
+        _log(f"EQE CALIBRATION ABORTED! " + str(e), 40, mqttc)
+    finally:
+        # the worker process outlives this action, so don't leave anything connected
+        measurement.disconnect_all_instruments()
+
+    mqttc.append_payload(
+        "measurement/status", _READY, retain=True,
+    )
 
 
 def _calibrate_psu(request, mqtthost):
@@ -184,169 +341,171 @@ def _calibrate_psu(request, mqtthost):
     """
     print("Calibrating psu...")
 
-    with MQTTQueuePublisher() as mqttc:
-        mqttc.connect(mqtthost)
-        mqttc.loop_start()
-        try:
-            with fabric() as measurement:
-                measurement.current_limit = request["config"]["smu"]["current_limit"]
+    mqttc = _get_publisher(mqtthost)
+    measurement = fabric()
+    try:
+        with measurement:
+            measurement.current_limit = request["config"]["smu"]["current_limit"]
 
-                _log("Calibration LED PSU...", 20, mqttc)
+            _log("Calibration LED PSU...", 20, mqttc)
 
-                config = request["config"]
-                args = request["args"]
+            config = request["config"]
+            args = request["args"]
 
-                # get pixel queue
-                if 'EQE_stuff' in args:
-                    pixel_queue = _build_q(request, experiment="eqe")
-                else:
-                    # if it's empty, assume cal diode is connected externally
-                    pixel_dict = {
-                        "label": args["label_tree"][0],
-                        "layout": None,
-                        "sub_name": None,
-                        "pixel": 0,
-                        "pos": None,
-                        "area": None,
-                    }
-                    pixel_queue = collections.deque()
-                    pixel_queue.append(pixel_dict)
-
-                if request['args']['enable_stage'] == True:
-                    motion_address = config["stage"]["uri"]
-                else:
-                    motion_address = None
-
-                # the general purpose pcb object is to be virtualized
-                gp_pcb_is_fake = config["controller"]["virtual"]
-                gp_pcb_address = config["controller"]["address"]
-
-                # the motion pcb object is to be virtualized
-                motion_pcb_is_fake = config["stage"]["virtual"]
-
-                # connect instruments
-                measurement.connect_instruments(
-                    visa_lib=config["visa"]["visa_lib"],
-                    smu_address=config["smu"]["address"],
-                    smu_virt=config["smu"]["virtual"],
-                    smu_terminator=config["smu"]["terminator"],
-                    smu_baud=config["smu"]["baud"],
-                    smu_front_terminals=config["smu"]["front_terminals"],
-                    smu_two_wire=config["smu"]["two_wire"],
-                    pcb_address=gp_pcb_address,
-                    pcb_virt=gp_pcb_is_fake,
-                    motion_address=motion_address,
-                    motion_virt=motion_pcb_is_fake,
-                    psu_address=config["psu"]["address"],
-                    psu_virt=config["psu"]["virtual"],
-                    psu_terminator=config["psu"]["terminator"],
-                    psu_baud=config["psu"]["baud"],
-                    psu_ocps=[
-                        config["psu"]["ch1_ocp"],
-                        config["psu"]["ch2_ocp"],
-                        config["psu"]["ch3_ocp"],
-                    ],
-                )
+            # get pixel queue
+            if 'EQE_stuff' in args:
+                pixel_queue = _build_q(request, experiment="eqe")
+            else:
+                # if it's empty, assume cal diode is connected externally
+                pixel_dict = {
+                    "label": args["label_tree"][0],
+                    "layout": None,
+                    "sub_name": None,
+                    "pixel": 0,
+                    "pos": None,
+                    "area": None,
+                }
+                pixel_queue = collections.deque()
+                pixel_queue.append(pixel_dict)
+
+            if request['args']['enable_stage'] == True:
+                motion_address = config["stage"]["uri"]
+            else:
+                motion_address = None
+
+            # the general purpose pcb object is to be virtualized
+            gp_pcb_is_fake = config["controller"]["virtual"]
+            gp_pcb_address = config["controller"]["address"]
+
+            # the motion pcb object is to be virtualized
+            motion_pcb_is_fake = config["stage"]["virtual"]
+
+            # connect instruments
+            measurement.connect_instruments(
+                visa_lib=config["visa"]["visa_lib"],
+                smu_address=config["smu"]["address"],
+                smu_virt=config["smu"]["virtual"],
+                smu_terminator=config["smu"]["terminator"],
+                smu_baud=config["smu"]["baud"],
+                smu_front_terminals=config["smu"]["front_terminals"],
+                smu_two_wire=config["smu"]["two_wire"],
+                pcb_address=gp_pcb_address,
+                pcb_virt=gp_pcb_is_fake,
+                motion_address=motion_address,
+                motion_virt=motion_pcb_is_fake,
+                psu_address=config["psu"]["address"],
+                psu_virt=config["psu"]["virtual"],
+                psu_terminator=config["psu"]["terminator"],
+                psu_baud=config["psu"]["baud"],
+                psu_ocps=[
+                    config["psu"]["ch1_ocp"],
+                    config["psu"]["ch2_ocp"],
+                    config["psu"]["ch3_ocp"],
+                ],
+            )
+
+            fake_pcb = measurement.fake_pcb
+            inner_pcb = measurement.fake_pcb
+            inner_init_args = {}
+            if gp_pcb_address is not None:
+                if (motion_pcb_is_fake == False) or (gp_pcb_is_fake == False):
+                    inner_pcb = measurement.real_pcb
+                    inner_init_args['timeout'] = 1
+                    inner_init_args['address'] = gp_pcb_address
+            with fake_pcb() as fake_p:
+                with inner_pcb(**inner_init_args) as inner_p:
+                    if gp_pcb_is_fake == True:
+                        gp_pcb = fake_p
+                    else:
+                        gp_pcb = inner_p
 
-                fake_pcb = measurement.fake_pcb
-                inner_pcb = measurement.fake_pcb
-                inner_init_args = {}
-                if gp_pcb_address is not None:
-                    if (motion_pcb_is_fake == False) or (gp_pcb_is_fake == False):
-                        inner_pcb = measurement.real_pcb
-                        inner_init_args['timeout'] = 1
-                        inner_init_args['address'] = gp_pcb_address
-                with fake_pcb() as fake_p:
-                    with inner_pcb(**inner_init_args) as inner_p:
-                        if gp_pcb_is_fake == True:
-                            gp_pcb = fake_p
+                    if motion_address is not None:
+                        if motion_pcb_is_fake == gp_pcb_is_fake:
+                            mo = measurement.motion(motion_address, pcb_object=gp_pcb)
+                        elif motion_pcb_is_fake == True:
+                            mo = measurement.motion(motion_address, pcb_object=fake_p)
                         else:
-                            gp_pcb = inner_p
-
-                        if motion_address is not None:
-                            if motion_pcb_is_fake == gp_pcb_is_fake:
-                                mo = measurement.motion(motion_address, pcb_object=gp_pcb)
-                            elif motion_pcb_is_fake == True:
-                                mo = measurement.motion(motion_address, pcb_object=fake_p)
-                            else:
-                                mo = measurement.motion(motion_address, pcb_object=inner_p)
-                            mo.connect()
-                        else:
-                            mo = None
+                            mo = measurement.motion(motion_address, pcb_object=inner_p)
+                        mo.connect()
+                    else:
+                        mo = None
 
-                        if args['enable_eqe'] == True:  # we don't need to switch the relay if there is no EQE
-                            # using smu to measure the current from the photodiode
-                            resp = measurement.set_experiment_relay("iv", gp_pcb)
+                    if args['enable_eqe'] == True:  # we don't need to switch the relay if there is no EQE
+                        # using smu to measure the current from the photodiode
+                        resp = measurement.set_experiment_relay("iv", gp_pcb)
 
-                            if resp != "":
-                                _log(f"Experiment relay error: {resp}! Aborting run", 40, mqttc)
-                                return
+                        if resp != "":
+                            _log(f"Experiment relay error: {resp}! Aborting run", 40, mqttc)
+                            return
 
-                        last_label = None
-                        while len(pixel_queue) > 0:
-                            pixel = pixel_queue.popleft()
-                            label = pixel["label"]
-                            pix = pixel["pixel"]
-                            _log(
-                                f"Operating on substrate {label}, pixel {pix}...", 20, mqttc,
-                            )
+                    last_label = None
+                    while pixel_queue:
+                        pixel = pixel_queue.popleft()
+                        label = pixel["label"]
+                        pix = pixel["pixel"]
+                        _log(
+                            f"Operating on substrate {label}, pixel {pix}...", 20, mqttc,
+                        )
 
-                            # add id str to handlers to display on plots
-                            idn = f"{label}_pixel{pix}"
+                        # add id str to handlers to display on plots
+                        idn = f"{label}_pixel{pix}"
 
-                            print(pixel)
+                        print(pixel)
 
-                            # we have a new substrate
-                            if last_label != label:
-                                _log(
-                                    f"New substrate using '{pixel['layout']}' layout!",
-                                    20,
-                                    mqttc,
+                        # we have a new substrate
+                        if last_label != label:
+                            _log(
+                                f"New substrate using '{pixel['layout']}' layout!",
+                                20,
+                                mqttc,
+                            )
+                            last_label = label
+
+                        # move to pixel
+                        measurement.goto_pixel(pixel, mo)
+
+                        resp = measurement.select_pixel(pixel, gp_pcb)
+                        if resp != 0:
+                            _log(f"Mux error: {resp}! Aborting run!", 40, mqttc)
+                            break
+
+                        timestamp = time.time()
+
+                        # perform measurement
+                        for channel in [1, 2, 3]:
+                            if config["psu"][f"ch{channel}_ocp"] != 0:
+                                psu_calibration = measurement.calibrate_psu(
+                                    channel,
+                                    0.9 * config["psu"][f"ch{channel}_ocp"],
+                                    10,
+                                    config["psu"][f"ch{channel}_voltage"],
                                 )
-                                last_label = label
-
-                            # move to pixel
-                            measurement.goto_pixel(pixel, mo)
-
-                            resp = measurement.select_pixel(pixel, gp_pcb)
-                            if resp != 0:
-                                _log(f"Mux error: {resp}! Aborting run!", 40, mqttc)
-                                break
-
-                            timestamp = time.time()
-
-                            # perform measurement
-                            for channel in [1, 2, 3]:
-                                if config["psu"][f"ch{channel}_ocp"] != 0:
-                                    psu_calibration = measurement.calibrate_psu(
-                                        channel,
-                                        0.9 * config["psu"][f"ch{channel}_ocp"],
-                                        10,
-                                        config["psu"][f"ch{channel}_voltage"],
-                                    )
-
-                                    diode_dict = {
-                                        "data": psu_calibration,
-                                        "timestamp": timestamp,
-                                        "diode": idn,
-                                    }
-                                    mqttc.append_payload(
-                                        f"calibration/psu/ch{channel}",
-                                        pickle.dumps(diode_dict),
-                                        retain=True,
-                                    )
-
-                _log("LED PSU calibration complete!", 20, mqttc)
-            print("Finished calibrating PSU.")
-        except KeyboardInterrupt:
-            pass
-        except Exception as e:
-            traceback.print_exc()
-            _log(f"PSU CALIBRATION ABORTED! " + str(e), 40, mqttc)
 
-        mqttc.append_payload(
-            "measurement/status", pickle.dumps("Ready"), retain=True,
-        )
+                                diode_dict = {
+                                    "data": psu_calibration,
+                                    "timestamp": timestamp,
+                                    "diode": idn,
+                                }
+                                mqttc.append_payload(
+                                    f"calibration/psu/ch{channel}",
+                                    pickle.dumps(diode_dict),
+                                    retain=True,
+                                )
+
+            _log("LED PSU calibration complete!", 20, mqttc)
+        print("Finished calibrating PSU.")
+    except KeyboardInterrupt:
+        pass
+    except Exception as e:
+        traceback.print_exc()
+        _log(f"PSU CALIBRATION ABORTED! " + str(e), 40, mqttc)
+    finally:
+        # the worker process outlives this action, so don't leave anything connected
+        measurement.disconnect_all_instruments()
+
+    mqttc.append_payload(
+        "measurement/status", _READY, retain=True,
+    )
 
 
 def _calibrate_spectrum(request, mqtthost):
@@ -365,48 +524,50 @@ def _calibrate_spectrum(request, mqtthost):
 
     user_aborted = False
 
-    with MQTTQueuePublisher() as mqttc:
-        mqttc.connect(mqtthost)
-        mqttc.loop_start()
+    mqttc = _get_publisher(mqtthost)
 
-        try:
-            with fabric() as measurement:
-                measurement.current_limit = request["config"]["smu"]["current_limit"]
+    measurement = fabric()
+    try:
+        with measurement:
+            measurement.current_limit = request["config"]["smu"]["current_limit"]
 
-                _log("Calibrating solar simulator spectrum...", 20, mqttc)
+            _log("Calibrating solar simulator spectrum...", 20, mqttc)
 
-                config = request["config"]
-                args = request["args"]
+            config = request["config"]
+            args = request["args"]
 
-                measurement.connect_instruments(
-                    visa_lib=config["visa"]["visa_lib"],
-                    light_address=config["solarsim"]["address"],
-                    light_virt=config["solarsim"]["virtual"],
-                    light_recipe=args["light_recipe"],
-                )
-                measurement.le.set_intensity(int(args["light_recipe_int"]))
+            measurement.connect_instruments(
+                visa_lib=config["visa"]["visa_lib"],
+                light_address=config["solarsim"]["address"],
+                light_virt=config["solarsim"]["virtual"],
+                light_recipe=args["light_recipe"],
+            )
+            measurement.le.set_intensity(int(args["light_recipe_int"]))
 
-                timestamp = time.time()
+            timestamp = time.time()
 
-                spectrum = measurement.measure_spectrum()
+            spectrum = measurement.measure_spectrum()
 
-                spectrum_dict = {"data": spectrum, "timestamp": timestamp}
+            spectrum_dict = {"data": spectrum, "timestamp": timestamp}
 
-                # publish calibration
-                mqttc.append_payload(
-                    "calibration/spectrum", pickle.dumps(spectrum_dict), retain=True
-                )
+            # publish calibration
+            mqttc.append_payload(
+                "calibration/spectrum", pickle.dumps(spectrum_dict), retain=True
+            )
 
-                _log("Finished calibrating solar simulator spectrum!", 20, mqttc)
+            _log("Finished calibrating solar simulator spectrum!", 20, mqttc)
 
-            print("Spectrum calibration complete.")
-        except KeyboardInterrupt:
-            user_aborted = True
-        except Exception as e:
-            traceback.print_exc()
-            _log(f"SPECTRUM CALIBRATION ABORTED! " + str(e), 40, mqttc)
+        print("Spectrum calibration complete.")
+    except KeyboardInterrupt:
+        user_aborted = True
+    except Exception as e:
+        traceback.print_exc()
+        _log(f"SPECTRUM CALIBRATION ABORTED! " + str(e), 40, mqttc)
+    finally:
+        # the worker process outlives this action, so don't leave anything connected
+        measurement.disconnect_all_instruments()
 
-        mqttc.append_payload("measurement/status", pickle.dumps("Ready"), retain=True)
+    mqttc.append_payload("measurement/status", _READY, retain=True)
 
     return user_aborted
 
@@ -753,72 +914,6 @@ def _calibrate_spectrum(request, mqtthost):
 #         mqttc.append_payload("measurement/status", pickle.dumps("Ready"), retain=True)
 
 
-# def _get_substrate_positions(config, experiment):
-#     """Calculate absolute positions of all substrate centres.
-
-#     Read in info from config file.
-
-#     Parameters
-#     ----------
-#     experiment : str
-#         Name used to look up the experiment centre stage position from the config
-#         file.
-
-#     Returns
-#     -------
-#     substrate_centres : list of lists
-#         Absolute substrate centre co-ordinates. Each sublist contains the positions
-#         along each axis.
-#     """
-#     experiment_centre = config["stage"]["experiment_positions"][experiment]
-#     print(f"{experiment} center: {experiment_centre}")
-
-#     # read in number substrates in the array along each axis
-#     substrate_number = config["substrates"]["number"]
-
-#     # get number of substrate centres between the centre and the edge of the
-#     # substrate array along each axis, e.g. if there are 4 rows, there are 1.5
-#     # substrate centres to the outermost substrate
-#     substrate_offsets = []
-#     substrate_total = 1
-#     for number in substrate_number:
-#         if number % 2 == 0:
-#             offset = number / 2 - 0.5
-#         else:
-#             offset = np.floor(number / 2)
-#         substrate_offsets.append(offset)
-#         substrate_total = substrate_total * number
-
-#     print(f"Substrate offsets: {substrate_offsets}")
-
-#     # read in substrate spacing in mm along each axis into a list
-#     substrate_spacing = config["substrates"]["spacing"]
-
-#     # get absolute substrate centres along each axis
-#     axis_pos = []
-#     for offset, spacing, number, centre in zip(
-#         substrate_offsets, substrate_spacing, substrate_number, experiment_centre,
-#     ):
-#         abs_offset = offset * spacing
-#         print(f"Offset from experiment centre: {abs_offset}")
-#         axis_pos.append(np.linspace(-abs_offset + centre, abs_offset + centre, number))
-
-#     print(f"Positions along each axis: {axis_pos}")
-
-#     # create array of positions
-#     substrate_centres = []
-#     n_axes = len(axis_pos)
-#     if n_axes == 2:
-#         for y in axis_pos[1]:
-#             substrate_centres += [[x, y] for x in axis_pos[0]]
-#     elif n_axes == 1:
-#         substrate_centres = [[x] for x in axis_pos[0]]
-
-#     print(f"Substrate centres (absolute): {substrate_centres}")
-
-#     return substrate_centres
-
-
 def _build_q(request, experiment):
     """Generate a queue of pixels to run through.
 
@@ -847,21 +942,37 @@ def _build_q(request, experiment):
         raise(ValueError(f"Unknown experiment: {experiment}"))
     center = config["stage"]["experiment_positions"][experiment]
     
+    # absolute stage positions of every pixel in one broadcast add, using only
+    # as many loc components as the stage has axes
+    n_axes = len(center)
+    locs = np.asarray(stuff["loc"].tolist(), dtype=float)
+    if len(locs) == 0:
+        positions = []
+    elif (locs.ndim != 2) or (locs.shape[1] < n_axes):
+        raise(ValueError(f"Pixel locations of shape {locs.shape} don't cover the {n_axes} stage axes"))
+    else:
+        positions = (locs[:, :n_axes] + center).tolist()
+
     # build pixel queue
     pixel_q = collections.deque()
-    # here we build up the pixel handling queue by iterating
-    # through the rows of a pandas dataframe
-    # that contains one row for each turned on pixel
-    for things in stuff.to_dict(orient='records'):
+    # here we build up the pixel handling queue column-wise from a pandas
+    # dataframe that contains one row for each turned on pixel, rather than
+    # materialising a dict per row first
+    for label, layout, sub_name, mux_index, pos, area in zip(
+        stuff["label"],
+        stuff["layout"],
+        stuff["system_label"],
+        stuff["mux_index"],
+        positions,
+        stuff["area"],
+    ):
         pixel_dict = {}
-        pixel_dict['label'] = things['label']
-        pixel_dict['layout'] = things['layout']
-        pixel_dict['sub_name'] = things['system_label']
-        pixel_dict['pixel'] = things['mux_index']
-        loc = things['loc']
-        pos = [a+b for a,b in zip(center,loc)]
+        pixel_dict['label'] = label
+        pixel_dict['layout'] = layout
+        pixel_dict['sub_name'] = sub_name
+        pixel_dict['pixel'] = mux_index
         pixel_dict['pos'] = pos
-        pixel_dict['area'] = things['area']
+        pixel_dict['area'] = area
         pixel_q.append(pixel_dict)
     return pixel_q
 
@@ -939,8 +1050,7 @@ def _clear_plot(kind, mqttqp):
     mqttqp : MQTTQueuePublisher
         MQTT queue publisher object that publishes measurement data.
     """
-    payload = ""
-    mqttqp.append_payload(f"plotter/{kind}/clear", pickle.dumps(payload))
+    mqttqp.append_payload(f"plotter/{kind}/clear", _CLEAR)
 
 
 def _log(msg, level, mqttqp):
@@ -1063,8 +1173,52 @@ def _ivt(pixel_queue, request, measurement, mqttc, calibration=False, rtd=False)
                     _log(f"Experiment relay error: {resp}! Aborting run", 40, mqttc)
                     return
 
+            # detmine type of sweeps to perform
+            sweeps = []
+            if args["sweep_check"] == True:
+                if (s := args["lit_sweep"]) == 0:
+                    sweeps = ["dark", "light"]
+                elif s == 1:
+                    sweeps = ["light", "dark"]
+                elif s == 2:
+                    sweeps = ["dark"]
+                elif s == 3:
+                    sweeps = ["light"]
+
+            # measurement settings that don't change from pixel to pixel, only
+            # looked up for the stages that are actually enabled
+            if args["i_dwell"] > 0:
+                vt_args = {}
+                vt_args['t_dwell'] = args["i_dwell"]
+                vt_args['NPLC'] = args["nplc"]
+                vt_args['sourceVoltage'] = False
+                vt_args['compliance'] = 3
+                vt_args['senseRange'] = "a"
+                vt_args['setPoint'] = args["i_dwell_value"]
+
+            if args["v_dwell"] > 0:
+                it_args = {}
+                it_args['t_dwell'] = args["v_dwell"]
+                it_args['NPLC'] = args["nplc"]
+                it_args['sourceVoltage'] = True
+                it_args['senseRange'] = "a"
+                it_args['setPoint'] = args["v_dwell_value"]
+
+            if sweeps:
+                sweep1_args = {}
+                sweep1_args['sourceVoltage'] = True
+                sweep1_args['nPoints'] = int(args["iv_steps"])
+                sweep1_args['stepDelay'] = source_delay
+                sweep1_args['start'] = args["sweep_start"]
+                sweep1_args['end'] = args["sweep_end"]
+                sweep1_args['NPLC'] = args["nplc"]
+
+                sweep2_args = sweep1_args.copy()
+                sweep2_args['start'] = args["sweep_end"]
+                sweep2_args['end'] = args["sweep_start"]
+
             # scan through the pixels and do the requested measurements
-            while len(pixel_queue) > 0:
+            while pixel_queue:
                 # instantiate container for all measurement data on pixel
                 data = []
 
@@ -1126,15 +1280,7 @@ def _ivt(pixel_queue, request, measurement, mqttc, calibration=False, rtd=False)
                         dh.kind = kind
                         _clear_plot(kind, mqttc)
 
-                    vt = measurement.steady_state(
-                        t_dwell=args["i_dwell"],
-                        NPLC=args["nplc"],
-                        sourceVoltage=False,
-                        compliance=3,
-                        senseRange="a",
-                        setPoint=args["i_dwell_value"],
-                        handler=handler,
-                    )
+                    vt = measurement.steady_state(**vt_args, handler=handler)
 
                     data += vt
 
@@ -1144,19 +1290,6 @@ def _ivt(pixel_queue, request, measurement, mqttc, calibration=False, rtd=False)
                     else:
                         ssvoc = None
 
-                # if performing sweeps
-                sweeps = []
-                if args["sweep_check"] == True:
-                    # detmine type of sweeps to perform
-                    if (s := args["lit_sweep"]) == 0:
-                        sweeps = ["dark", "light"]
-                    elif s == 1:
-                        sweeps = ["light", "dark"]
-                    elif s == 2:
-                        sweeps = ["dark"]
-                    elif s == 3:
-                        sweeps = ["light"]
-
                 # perform sweeps
                 for sweep in sweeps:
                     # sweeps may or may not need light
@@ -1179,17 +1312,12 @@ def _ivt(pixel_queue, request, measurement, mqttc, calibration=False, rtd=False)
                             dh.sweep = sweep
                             _clear_plot("iv_measurement", mqttc)
 
-                        sweep_args = {}
-                        sweep_args['sourceVoltage'] = True
-                        sweep_args['senseRange'] = sense_range
-                        sweep_args['compliance'] = compliance_i
-                        sweep_args['nPoints'] = int(args["iv_steps"])
-                        sweep_args['stepDelay'] = source_delay
-                        sweep_args['start'] = args["sweep_start"]
-                        sweep_args['end'] = args["sweep_end"]
-                        sweep_args['NPLC'] = args["nplc"]
-                        sweep_args['handler'] = handler
-                        iv1 = measurement.sweep(**sweep_args)
+                        iv1 = measurement.sweep(
+                            **sweep1_args,
+                            senseRange=sense_range,
+                            compliance=compliance_i,
+                            handler=handler,
+                        )
 
                         data += iv1
 
@@ -1204,17 +1332,12 @@ def _ivt(pixel_queue, request, measurement, mqttc, calibration=False, rtd=False)
                             dh.kind = kind
                             dh.sweep = sweep
 
-                        sweep_args = {}
-                        sweep_args['sourceVoltage'] = True
-                        sweep_args['senseRange'] = sense_range
-                        sweep_args['compliance'] = compliance_i
-                        sweep_args['nPoints'] = int(args["iv_steps"])
-                        sweep_args['stepDelay'] = source_delay
-                        sweep_args['start'] = args["sweep_end"]
-                        sweep_args['end'] = args["sweep_start"]
-                        sweep_args['NPLC'] = args["nplc"]
-                        sweep_args['handler'] = handler
-                        iv2 = measurement.sweep(**sweep_args)
+                        iv2 = measurement.sweep(
+                            **sweep2_args,
+                            senseRange=sense_range,
+                            compliance=compliance_i,
+                            handler=handler,
+                        )
 
                         data += iv2
 
@@ -1283,15 +1406,7 @@ def _ivt(pixel_queue, request, measurement, mqttc, calibration=False, rtd=False)
                         dh.kind = kind
                         _clear_plot(kind, mqttc)
 
-                    it = measurement.steady_state(
-                        t_dwell=args["v_dwell"],
-                        NPLC=args["nplc"],
-                        sourceVoltage=True,
-                        compliance=compliance_i,
-                        senseRange="a",
-                        setPoint=args["v_dwell_value"],
-                        handler=handler,
-                    )
+                    it = measurement.steady_state(**it_args, compliance=compliance_i, handler=handler)
 
                     data += it
 
@@ -1401,8 +1516,43 @@ def _eqe(pixel_queue, request, measurement, mqttc, calibration=False):
                 _log(f"Experiment relay error: {resp}! Aborting run", 40, mqttc)
                 return
 
+            # if time constant is longer than 1s the instrument aborts its autogain
+            # function so need to make sure "user" is used under these conditions
+            if ((auto_gain_method := config["lia"]["auto_gain_method"]) == "instr") and (
+                measurement.lia.time_contstants[args["eqe_int"]] > 1
+            ):
+                auto_gain_method = "user"
+                _log(
+                    (
+                        "Instrument autogain cannot be used when time constant > 1s. 'user'"
+                        + " autogain setting will be used instead."
+                    ),
+                    30,
+                    mqttc,
+                )
+
+            # eqe settings that don't change from pixel to pixel
+            eqe_args = {}
+            eqe_args['psu_ch1_voltage'] = config["psu"]["ch1_voltage"]
+            eqe_args['psu_ch1_current'] = args["chan1"]
+            eqe_args['psu_ch2_voltage'] = config["psu"]["ch2_voltage"]
+            eqe_args['psu_ch2_current'] = args["chan2"]
+            eqe_args['psu_ch3_voltage'] = config["psu"]["ch3_voltage"]
+            eqe_args['psu_ch3_current'] = args["chan3"]
+            eqe_args['smu_voltage'] = args["eqe_bias"]
+            eqe_args['start_wl'] = args["eqe_start"]
+            eqe_args['end_wl'] = args["eqe_end"]
+            eqe_args['num_points'] = int(args["eqe_step"])
+            eqe_args['grating_change_wls'] = config["monochromator"]["grating_change_wls"]
+            eqe_args['filter_change_wls'] = config["monochromator"]["filter_change_wls"]
+            eqe_args['time_constant'] = args["eqe_int"]
+            eqe_args['auto_gain'] = True
+            eqe_args['auto_gain_method'] = auto_gain_method
+
+            scan_msg = f"Scanning EQE from {args['eqe_start']} nm to {args['eqe_end']} nm"
+
             last_label = None
-            while len(pixel_queue) > 0:
+            while pixel_queue:
                 pixel = pixel_queue.popleft()
                 label = pixel["label"]
                 pix = pixel["pixel"]
@@ -1429,29 +1579,10 @@ def _eqe(pixel_queue, request, measurement, mqttc, calibration=False):
                     _log(f"Mux error: {resp}! Aborting run!", 40, mqttc)
                     break
 
-                _log(
-                    f"Scanning EQE from {args['eqe_start']} nm to {args['eqe_end']} nm",
-                    20,
-                    mqttc,
-                )
+                _log(scan_msg, 20, mqttc)
 
                 compliance_i = measurement.compliance_current_guess(pixel["area"])
 
-                # if time constant is longer than 1s the instrument aborts its autogain
-                # function so need to make sure "user" is used under these conditions
-                if ((auto_gain_method := config["lia"]["auto_gain_method"]) == "instr") and (
-                    measurement.lia.time_contstants[args["eqe_int"]] > 1
-                ):
-                    auto_gain_method = "user"
-                    _log(
-                        (
-                            "Instrument autogain cannot be used when time constant > 1s. 'user'"
-                            + " autogain setting will be used instead."
-                        ),
-                        30,
-                        mqttc,
-                    )
-
                 # determine how live measurement data will be handled
                 if calibration == True:
                     handler = lambda x: None
@@ -1465,25 +1596,7 @@ def _eqe(pixel_queue, request, measurement, mqttc, calibration=False):
                 timestamp = time.time()
 
                 # perform measurement
-                eqe = measurement.eqe(
-                    psu_ch1_voltage=config["psu"]["ch1_voltage"],
-                    psu_ch1_current=args["chan1"],
-                    psu_ch2_voltage=config["psu"]["ch2_voltage"],
-                    psu_ch2_current=args["chan2"],
-                    psu_ch3_voltage=config["psu"]["ch3_voltage"],
-                    psu_ch3_current=args["chan3"],
-                    smu_voltage=args["eqe_bias"],
-                    smu_compliance=compliance_i,
-                    start_wl=args["eqe_start"],
-                    end_wl=args["eqe_end"],
-                    num_points=int(args["eqe_step"]),
-                    grating_change_wls=config["monochromator"]["grating_change_wls"],
-                    filter_change_wls=config["monochromator"]["filter_change_wls"],
-                    time_constant=args["eqe_int"],
-                    auto_gain=True,
-                    auto_gain_method=auto_gain_method,
-                    handler=handler,
-                )
+                eqe = measurement.eqe(**eqe_args, smu_compliance=compliance_i, handler=handler)
 
                 # update eqe diode calibration data in
                 if calibration == True:
@@ -1514,35 +1627,37 @@ def _run(request, mqtthost):
         user_aborted = _calibrate_spectrum(request, mqtthost)
 
     if user_aborted == False:
-        with MQTTQueuePublisher() as mqttc:
-            mqttc.connect(mqtthost)
-            mqttc.loop_start()
-            try:
-                with fabric() as measurement:
-                    _log("Starting run...", 20, mqttc)
-                    measurement.current_limit = request["config"]["smu"]["current_limit"]
+        mqttc = _get_publisher(mqtthost)
+        measurement = fabric()
+        try:
+            with measurement:
+                _log("Starting run...", 20, mqttc)
+                measurement.current_limit = request["config"]["smu"]["current_limit"]
 
-                    if 'IV_stuff' in args:
-                        q = _build_q(request, experiment="solarsim")
-                        _ivt(q, request, measurement, mqttc)
-                        measurement.disconnect_all_instruments()
+                if 'IV_stuff' in args:
+                    q = _build_q(request, experiment="solarsim")
+                    _ivt(q, request, measurement, mqttc)
+                    measurement.disconnect_all_instruments()
 
-                    if 'EQE_stuff' in args:
-                        q = _build_q(request, experiment="eqe")
-                        _eqe(q, request, measurement, mqttc)
-                        measurement.disconnect_all_instruments()
+                if 'EQE_stuff' in args:
+                    q = _build_q(request, experiment="eqe")
+                    _eqe(q, request, measurement, mqttc)
+                    measurement.disconnect_all_instruments()
 
-                    # report complete
-                    _log("Run complete!", 20, mqttc)
+                # report complete
+                _log("Run complete!", 20, mqttc)
 
-                print("Measurement complete.")
-            except KeyboardInterrupt:
-                pass
-            except Exception as e:
-                traceback.print_exc()
-                _log(f"RUN ABORTED! " + str(e), 40, mqttc)
+            print("Measurement complete.")
+        except KeyboardInterrupt:
+            pass
+        except Exception as e:
+            traceback.print_exc()
+            _log(f"RUN ABORTED! " + str(e), 40, mqttc)
+        finally:
+            # the worker process outlives this action, so don't leave anything connected
+            measurement.disconnect_all_instruments()
 
-            mqttc.append_payload("measurement/status", pickle.dumps("Ready"), retain=True)
+        mqttc.append_payload("measurement/status", _READY, retain=True)
 
 
 def on_message(mqttc, obj, msg, msg_queue):
@@ -1550,47 +1665,53 @@ def on_message(mqttc, obj, msg, msg_queue):
     msg_queue.put_nowait(msg)
 
 
-def msg_handler(msg_queue, cli_args, process):
+# actions run in the worker, each with a check that the instruments it needs are enabled
+_actions = {
+    "run": (_run, lambda args: (args["enable_eqe"] == True) or (args["enable_iv"] == True)),
+    "calibrate_eqe": (_calibrate_eqe, lambda args: args["enable_eqe"] == True),
+    "calibrate_psu": (
+        _calibrate_psu,
+        lambda args: (args["enable_psu"] == True) and (args["enable_smu"] == True),
+    ),
+    # "calibrate_solarsim_diodes": (
+    #     _calibrate_solarsim_diodes,
+    #     lambda args: (args["enable_solarsim"] == True) and (args["enable_smu"] == True),
+    # ),
+    # "calibrate_spectrum": (_calibrate_spectrum, lambda args: args["enable_solarsim"] == True),
+    # "calibrate_rtd": (_calibrate_rtd, lambda args: args["enable_smu"] == True),
+    # "contact_check": (_contact_check, lambda args: args["enable_smu"] == True),
+    # "home": (_home, lambda args: args["enable_stage"] == True),
+    # "goto": (_goto, lambda args: args["enable_stage"] == True),
+    # "read_stage": (_read_stage, lambda args: args["enable_stage"] == True),
+}
+
+
+def msg_handler(msg_queue, cli_args, worker):
     """Handle MQTT messages in the msg queue.
 
     This function should run in a separate thread, polling the queue for messages.
 
-    Actions that require instrument I/O run in a worker process. Only one action
-    process can run at a time. If an action process is running the server will
-    report that it's busy.
+    Actions that require instrument I/O run in a persistent worker process. Only one
+    action can run at a time. If an action is running the server will report that
+    it's busy.
     """
     while True:
         msg = msg_queue.get()
 
         try:
             request = pickle.loads(msg.payload)
-            action = msg.topic.split("/")[-1]
+            action = msg.topic.rpartition("/")[2]
 
             # perform a requested action
-            if (action == "run") and ((request['args']['enable_eqe'] == True) or (request['args']['enable_iv'] == True)):
-                process = start_process(cli_args, process, _run, (request, cli_args.mqtthost,))
-            elif action == "stop":
-                process = stop_process(cli_args, process)
-            elif (action == "calibrate_eqe") and (request['args']['enable_eqe'] == True):
-                process = start_process(cli_args, process, _calibrate_eqe, (request, cli_args.mqtthost,))
-            elif (action == "calibrate_psu") and (request['args']['enable_psu'] == True) and (request['args']['enable_smu'] == True):
-                process = start_process(cli_args, process, _calibrate_psu, (request, cli_args.mqtthost,))
-            #elif (action == "calibrate_solarsim_diodes") and (request['args']['enable_solarsim'] == True) and (request['args']['enable_smu'] == True):
-            #    process = start_process(cli_args, process, _calibrate_solarsim_diodes, (request, cli_args.mqtthost,))
-            #elif (action == "calibrate_spectrum") and (request['args']['enable_solarsim'] == True):
-            #    process = start_process(cli_args, process, _calibrate_spectrum, (request, cli_args.mqtthost,))
-            #elif (action == "calibrate_rtd") and (request['args']['enable_smu'] == True):
-            #    process = start_process(cli_args, process, _calibrate_rtd, (request, cli_args.mqtthost,))
-            #elif (action == "contact_check") and (request['args']['enable_smu'] == True):
-            #    process = start_process(cli_args, process, _contact_check, (request, cli_args.mqtthost,))
-            #elif (action == "home") and (request['args']['enable_stage'] == True):
-            #    process = start_process(cli_args, process, _home, (request, cli_args.mqtthost,))
-            #elif (action == "goto") and (request['args']['enable_stage'] == True):
-            #    process = start_process(cli_args, process, _goto, (request, cli_args.mqtthost,))
-            #elif (action == "read_stage") and (request['args']['enable_stage'] == True):
-            #    process = start_process(cli_args, process, _read_stage, (request, cli_args.mqtthost,))
-        except:
-            pass
+            if action == "stop":
+                worker = stop_process(cli_args, worker)
+            elif action in _actions:
+                target, enabled = _actions[action]
+                if enabled(request["args"]) == True:
+                    worker = start_process(cli_args, worker, target, (request, cli_args.mqtthost,))
+        except Exception:
+            # a malformed request shouldn't take the server down, but say what went wrong
+            traceback.print_exc()
 
         msg_queue.task_done()
 
@@ -1598,8 +1719,8 @@ def main():
     # get command line arguments
     cli_args = get_args()
 
-    # create dummy process
-    process = multiprocessing.Process()
+    # start the action worker before any client threads exist
+    worker = ActionWorker()
 
     # queue for storing incoming messages
     msg_queue = queue.Queue()
@@ -1609,7 +1730,7 @@ def main():
 
     # setup mqtt subscriber client
     mqttc = mqtt.Client(client_id=client_id)
-    mqttc.will_set("measurement/status", pickle.dumps("Offline"), 2, retain=True)
+    mqttc.will_set("measurement/status", _OFFLINE, 2, retain=True)
     mqttc.on_message = lambda mqttc, obj, msg: on_message(mqttc, obj, msg, msg_queue)
     mqttc.connect(cli_args.mqtthost)
     mqttc.subscribe("measurement/#", qos=2)
@@ -1617,7 +1738,7 @@ def main():
 
     publish.single(
         "measurement/status",
-        pickle.dumps("Ready"),
+        _READY,
         qos=2,
         retain=True,
         hostname=cli_args.mqtthost,
@@ -1625,7 +1746,7 @@ def main():
 
     print(f"{client_id} connected!")
 
-    msg_handler(msg_queue, cli_args, process)
+    msg_handler(msg_queue, cli_args, worker)
 
 
 # required when using multiprocessing in windows, advised on other platforms
@@ -3,6 +3,7 @@
 from telnetlib import Telnet
 import socket
 import os
+import threading
 
 class pcb(object):
   """
@@ -40,6 +41,7 @@ class pcb(object):
 
   def __init__(self, address=None, timeout=comms_timeout):
     self.comms_timeout = timeout # pcb has this many seconds to respond
+    self.query_lock = threading.Lock()  # keeps background stage moves from interleaving with other queries
 
     if address is not None:
       addr_split = address.split(':')
@@ -53,6 +55,8 @@ class pcb(object):
   def __enter__(self):
     self.tn = self.MyTelnet(self.telnet_host, self.telnet_port, timeout=self.comms_timeout)
     self.sf = self.tn.sock.makefile("rwb", buffering=0)
+    # commands are tiny and we wait on each answer, so don't let Nagle hold them back
+    self.tn.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
 
     if os.name != 'nt':
       pcb.set_keepalive_linux(self.tn.sock)  # let's try to keep our connection alive!
@@ -71,24 +75,14 @@ class pcb(object):
   # figures out what muxes are connected
   def probe_muxes(self):
     mux_int = int(self.query('c'))
-    mux_bin_str = f"{mux_int:b}"
-    mux_bin_str_rev = mux_bin_str[::-1]
-    self.detected_muxes = []
     start_char = 'A'
-    for i, b in enumerate(mux_bin_str_rev):
-      if b == '1':
-        self.detected_muxes.append(chr(ord(start_char)+i))
+    self.detected_muxes = [chr(ord(start_char)+i) for i in range(mux_int.bit_length()) if (mux_int >> i) & 1]
 
 # figures out what axes are connected
   def probe_axes(self):
     axes_int = int(self.query('e'))
-    axes_bin_str = f"{axes_int:b}"
-    axes_bin_str_rev = axes_bin_str[::-1]
-    self.detected_axes = []
     start_char = '1'
-    for i, b in enumerate(axes_bin_str_rev):
-      if b == '1':
-        self.detected_axes.append(chr(ord(start_char)+i))
+    self.detected_axes = [chr(ord(start_char)+i) for i in range(axes_int.bit_length()) if (axes_int >> i) & 1]
 
   def __exit__(self, type, value, traceback):
     try:
@@ -121,13 +115,41 @@ class pcb(object):
     answer = None
     ack = False
     try:
-      answer, ack = self._query(query)
+      with self.query_lock:
+        answer, ack = self._query(query)
     except Exception:
       raise(ValueError(f"Firmware comms failure while trying to send '{query}'"))
     if ack == False:
       raise(ValueError(f"Firmware did not acknowledge '{query}'"))
     return answer
 
+  # sends several queries in one write then collects their answers in order
+  # saves a network round trip per query when the answers are independent
+  def query_many(self, queries):
+    if len(queries) == 0:
+      return []  # writing nothing would still send a bare terminator and leave its prompt unread
+    # a lost prompt would otherwise block the whole batch forever
+    if isinstance(self.comms_timeout, (int, float)):
+      read_timeout = self.comms_timeout
+    else:
+      read_timeout = None
+    responses = []
+    try:
+      with self.query_lock:
+        self.write(self.write_terminator.join(queries))
+        for q in queries:
+          responses.append(self.tn.read_response(timeout=read_timeout))
+        if not all(ack for answer, ack in responses):
+          self.tn.read_very_eager()  # toss whatever's left of the batch so later queries stay in step
+    except Exception:
+      raise(ValueError(f"Firmware comms failure while trying to send {queries}"))
+    answers = []
+    for q, (answer, ack) in zip(queries, responses):
+      if ack == False:
+        raise(ValueError(f"Firmware did not acknowledge '{q}'"))
+      answers.append(answer)
+    return answers
+
   def set_keepalive_linux(sock, after_idle_sec=1, interval_sec=3, max_fails=5):
     """Set TCP keepalive on an open socket.
 
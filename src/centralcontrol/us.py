@@ -1,7 +1,7 @@
 #!/usr/bin/env python3
 
 import time
-from collections import deque
+from collections import namedtuple
 
 
 # this boilerplate is required to allow this module to be run directly as a script
@@ -12,6 +12,9 @@ if __name__ == "__main__" and __package__ in [None, '']:
     # get the dir that holds __package__ on the front of the search path
     sys.path.insert(0, str(Path(__file__).parent.parent))
 
+# a snapshot of the whole stage, one entry per axis in each field
+MotionStatus = namedtuple("MotionStatus", ["pos", "lengths", "busy", "homed"])
+
 class us(object):
   """interface to uStepperS via i2c via ethernet connected pcb"""
   # calculate a default steps_per_mm value
@@ -23,7 +26,11 @@ class us(object):
   pcb = None
   len_axes_mm = [float('inf')]  # list of mm for how long the firmware thinks each axis is
   axes = [1]
+  ax_idx = {1: 0}  # axis -> index into axes (and len_axes_mm)
+  len_cmds = ["l1"]  # per-axis length queries, in axes order
+  pos_cmds = ["r1"]  # per-axis position queries, in axes order
   poll_delay = 0.25 # number of seconds to wait between polling events when trying to figure out if home, jog or goto are finsihed
+  min_poll_delay = 0.01  # shortest wait between goto polls when an axis is about to arrive
 
   end_buffers = 4  # disallow movement to closer than this many mm from an end (prevents home issues)
 
@@ -50,26 +57,41 @@ class us(object):
       raise(ValueError(f"Expecting integer response to {cmd}, but got {answer}"))
     return intans
 
+  # like _pwrapint, but for several commands sent to the pcb in one go
+  def _pwrapints(self, cmds):
+    answers = self.pcb.query_many(cmds)
+    intans = []
+    for cmd, answer in zip(cmds, answers):
+      try:
+        intans.append(int(answer))
+      except ValueError:
+        raise(ValueError(f"Expecting integer response to {cmd}, but got {answer}"))
+    return intans
+
+  # asks the pcb which axes are connected and refreshes the lookups that depend on that
+  def _probe_axes(self):
+    self.pcb.probe_axes()
+    self.axes = self.pcb.detected_axes
+    self.ax_idx = {ax: i for i, ax in enumerate(self.axes)}
+    self.len_cmds = [f"l{ax}" for ax in self.axes]
+    self.pos_cmds = [f"r{ax}" for ax in self.axes]
+
   def _update_len_axes_mm(self):
-    len_axes_mm = []
-    for ax in self.axes:
-      len_axes_mm.append(self._pwrapint(f"l{ax}")/self.steps_per_mm)
-    self.len_axes_mm = len_axes_mm
+    len_axes_steps = self._pwrapints(self.len_cmds)
+    self.len_axes_mm = [x/self.steps_per_mm for x in len_axes_steps]
 
   def connect(self):
     """
     opens connection to the motor controller
     and sets self.actual_lengths
     """
-    self.pcb.probe_axes()
-    self.axes = self.pcb.detected_axes
+    self._probe_axes()
     self._update_len_axes_mm()
     return 0
   
   def home(self, procedure="default", timeout=float("inf"), expected_lengths=None, allowed_deviation=None):
-    t0 = time.time()
-    self.pcb.probe_axes()
-    self.axes = self.pcb.detected_axes
+    t0 = time.monotonic()
+    self._probe_axes()
     self._update_len_axes_mm()
     if procedure == "default":
       for i, ax in enumerate(self.axes):
@@ -78,7 +100,7 @@ class us(object):
         if answer != '':
           raise(ValueError(f"Request to home axis {ax} via '{home_cmd}' failed with {answer}"))
         else:
-          self._wait_for_home_or_jog(ax, timeout=timeout-(time.time()-t0))
+          self._wait_for_home_or_jog(ax, timeout=timeout-(time.monotonic()-t0))
           if self.len_axes_mm[i] == 0:
             raise(ValueError(f"Homing of axis {ax} resulted in measured length of zero."))
     else:  # special home
@@ -103,9 +125,9 @@ class us(object):
           raise(ValueError(f"Error during specialized homing procedure. '{cmd}' rejected with {answer}"))
         else:
           if action in "hab":
-            self._wait_for_home_or_jog(ax, timeout=timeout-(time.time()-t0))
+            self._wait_for_home_or_jog(ax, timeout=timeout-(time.monotonic()-t0))
             if (action == "h"):
-              ai = self.axes.index(ax)
+              ai = self.ax_idx[ax]
               this_len = self.len_axes_mm[ai] 
               if this_len == 0:
                 raise(ValueError(f"Homing of axis {ax} resulted in measured length of zero."))
@@ -115,20 +137,20 @@ class us(object):
                 if delta > allowed_deviation:
                   raise(ValueError(f"Error: Unexpected axis {ax} length. Found {this_len} [mm] but expected {el} [mm]"))
           elif action == "g":
-            self._wait_for_goto(ax, goal, timeout=timeout-(time.time()-t0), debug_prints=False)
+            self._wait_for_goto(ax, goal, timeout=timeout-(time.monotonic()-t0), debug_prints=False)
 
   def _wait_for_home_or_jog(self, ax, timeout=float("inf"), debug_prints=False):
-    t0 = time.time()
-    ai = self.axes.index(ax)
-    poll_cmd = f"l{ax}"
+    t0 = time.monotonic()
+    ai = self.ax_idx[ax]
+    poll_cmd = self.len_cmds[ai]
     answer = None
     try:
       answer = self.pcb.query(poll_cmd)
       self.len_axes_mm[ai] = int(answer)/self.steps_per_mm
-    except Exception:
+    except (ValueError, TypeError):
       print(f"Warning: got unexpected home/jog poll result: {answer}")
       self.len_axes_mm[ai] = -1/self.steps_per_mm
-    dt = time.time() - t0
+    dt = time.monotonic() - t0
     while (self.len_axes_mm[ai] == -1/self.steps_per_mm) and (dt <= timeout):
       time.sleep(self.poll_delay)
       if debug_prints == True:
@@ -137,52 +159,68 @@ class us(object):
       try:
         answer = self.pcb.query(poll_cmd)
         self.len_axes_mm[ai] = int(answer)/self.steps_per_mm
-      except Exception:
+      except (ValueError, TypeError):
         print(f"Warning: got unexpected home/jog poll result: {answer}")
         self.len_axes_mm[ai] = -1/self.steps_per_mm
       if debug_prints == True:
         print(f'{ax}-l-a-{str(self.pcb.query(f"i{ax}")).rjust(8,"0")}')   # driver status byte print for debug
-      dt = time.time() - t0
+      dt = time.monotonic() - t0
     if (dt > timeout):
       raise(ValueError(f"Timeout while waiting for axis {ax} to home/jog. The duration was {dt} [s] but the limit is {timeout} [s]. The last answer was {answer}"))
 
   def _wait_for_goto(self, ax, goal, timeout=float("inf"), debug_prints=False):
-    t0 = time.time()
+    t0 = time.monotonic()
     poll_cmd = f"r{ax}"
     answer = None
-    answer_deque = deque([],3)
     rslt_pos = -1
     try:
       answer = self.pcb.query(poll_cmd)
       rslt_pos = int(answer)
-    except Exception:
+    except (ValueError, TypeError):
       print(f"Warning: got unexpected goto poll result: {answer}")
-    answer_deque.append(answer)
+    prev_answer = answer
+    prev_pos = rslt_pos
+    prev_t = time.monotonic()
+    last_change = prev_t  # when the reading last moved
+    delay = self.poll_delay
     go_from = rslt_pos/self.steps_per_mm
-    dt = time.time() - t0
+    dt = time.monotonic() - t0
     while (rslt_pos != goal) and (dt <= timeout):
-      time.sleep(self.poll_delay)
+      time.sleep(delay)
       if debug_prints == True:
         print(f'{ax}-l-b-{str(self.pcb.query(f"i{ax}")).rjust(8,"0")}')  # driver status byte print for debug
       answer = None
       try:
         answer = self.pcb.query(poll_cmd)
         rslt_pos = int(answer)
-      except Exception:
+      except (ValueError, TypeError):
         print(f"Warning: got unexpected goto poll result: {answer}")
-      answer_deque.append(answer)
-      if len(answer_deque) == 3:
-        if (answer_deque[0] == answer_deque[1]) and (answer_deque[1] == answer_deque[2]):
-          raise(ValueError(f"Motion seems to have stopped on {ax} at {rslt_pos/self.steps_per_mm} while trying to go from ~{go_from} to {goal/self.steps_per_mm}. Recent reading results were {answer_deque}"))
+      now = time.monotonic()
+      if answer == prev_answer:
+        delay = self.poll_delay
+        if (now - last_change) >= 2*self.poll_delay:
+          raise(ValueError(f"Motion seems to have stopped on {ax} at {rslt_pos/self.steps_per_mm} while trying to go from ~{go_from} to {goal/self.steps_per_mm}. The reading has been {answer} for {now - last_change:.2f} [s]"))
+      else:
+        last_change = now
+        # poll sooner as the axis closes in on its goal, going by how fast it moved since the last poll
+        speed = abs(rslt_pos - prev_pos)/(now - prev_t)
+        if speed > 0:
+          delay = min(self.poll_delay, max(self.min_poll_delay, abs(goal - rslt_pos)/speed))
+        else:
+          delay = self.poll_delay
+      prev_answer = answer
+      prev_pos = rslt_pos
+      prev_t = now
       if debug_prints == True:
         print(f'{ax}-l-a-{str(self.pcb.query(f"i{ax}")).rjust(8,"0")}')   # driver status byte print for debug
-      dt = time.time() - t0
+      dt = time.monotonic() - t0
     if (dt > timeout):
       raise(ValueError(f"Timeout while waiting for axis {ax} to go from {go_from} to {goal/self.steps_per_mm}. The duration was {dt} [s] but the limit is {timeout} [s]. The last answer was {answer}"))
 
   def goto(self, targets_mm, timeout=float("inf")):
-    t0 = time.time()
+    t0 = time.monotonic()
     targets_step = [round(x*self.steps_per_mm) for x in targets_mm]
+    # start the axes one at a time so a rejected start is seen before the next axis is sent off
     for i, target_step in enumerate(targets_step):
       ax = self.axes[i]
       cmd = f"g{ax}{target_step}"
@@ -196,29 +234,40 @@ class us(object):
         raise(ValueError(f"Error asking axis {ax} to go to {targets_mm[i]} with response {answer}.{note}"))
     for i, target_step in enumerate(targets_step):
       ax = self.axes[i]
-      self._wait_for_goto(ax, target_step, timeout=timeout-(time.time()-t0), debug_prints=False)
+      self._wait_for_goto(ax, target_step, timeout=timeout-(time.monotonic()-t0), debug_prints=False)
 
   # returns the stage's current position (a list matching the axes input)
   # axis is -1 for all available axes or a list of axes
   # returns None values for axes that could not be read
   def get_position(self):
-    result_mm = []
-    for ax in self.axes:
-      get_cmd = f"r{ax}"
-      answer = self._pwrapint(get_cmd)
-      result_mm.append(answer/self.steps_per_mm)
-    return result_mm
+    answers = self._pwrapints(self.pos_cmds)
+    return [x/self.steps_per_mm for x in answers]
+
+  def get_status(self):
+    """
+    reads the length and position of every axis in a single pass over the axes
+    returns a MotionStatus where pos and lengths are in mm, busy is True for axes that are homing or jogging
+    and homed is True for axes with a known length. pos is None for axes that can't report a position while busy
+    """
+    len_steps = self._pwrapints(self.len_cmds)
+    busy = [x == -1 for x in len_steps]
+    # the firmware refuses position requests while homing/jogging
+    idle_cmds = [cmd for cmd, ax_busy in zip(self.pos_cmds, busy) if not ax_busy]
+    idle_pos = iter(self._pwrapints(idle_cmds))
+    pos = [None if ax_busy else next(idle_pos)/self.steps_per_mm for ax_busy in busy]
+    lengths = [x/self.steps_per_mm for x in len_steps]
+    homed = [x > 0 for x in len_steps]
+    return MotionStatus(pos=pos, lengths=lengths, busy=busy, homed=homed)
 
   def estop(self, axes=-1):
     """
     Emergency stop of the driver. Unpowers the motor(s)
     """
+    # the global stop plus every axis stop go out in a single write so they land back to back
+    estop_cmds = ['b'] + [f"b{ax}" for ax in self.axes]
     # do it thrice because it's important
     for i in range(3):
-      self.pcb.query('b')
-      for ax in self.axes:
-        estop_cmd = f"b{ax}"
-        self.pcb.query(estop_cmd)
+      self.pcb.query_many(estop_cmds)
 
   def close(self):
     pass
@@ -177,6 +177,8 @@ class pcb(object):
       return ''
     else:
       return "Command virtually unsupported"
+  def query_many(self, queries):
+    return [self.query(q) for q in queries]
 
 class k2400(object):
   """Solar cell device simulator (looks like k2400 class)
@@ -0,0 +1,183 @@
+"""Checks for the pcb wire framing, motion address/goal handling and prefs.ini parsing."""
+
+import configparser
+import socket
+import threading
+
+import pytest
+
+from centralcontrol import virt
+from centralcontrol.motion import _parse_address, motion
+from centralcontrol.pcb import pcb
+from centralcontrol.us import us
+
+
+class FakeFirmware:
+    """Local telnet-ish server that answers like the control pcb firmware.
+
+    Every command line gets its answer followed by the prompt, except the
+    commands listed in `no_prompt`, whose answer comes back without one.
+    """
+
+    answers = {"v": "1.2.3", "c": "1", "e": "3"}
+
+    def __init__(self, no_prompt=()):
+        self.no_prompt = set(no_prompt)
+        self.received = []
+        self.srv = socket.socket()
+        self.srv.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.srv.bind(("127.0.0.1", 0))
+        self.srv.listen(1)
+        self.address = f"127.0.0.1:{self.srv.getsockname()[1]}"
+        threading.Thread(target=self.serve, daemon=True).start()
+
+    def answer(self, cmd):
+        if cmd in self.answers:
+            return self.answers[cmd]
+        if cmd[:1] in ("l", "r"):
+            return str(100 * int(cmd[1:]))  # easy to tell apart per axis
+        return ""
+
+    def serve(self):
+        conn, _ = self.srv.accept()
+        f = conn.makefile("rwb", buffering=0)
+        f.write(b"welcome\r\n>>> ")
+        while True:
+            line = f.readline()
+            if not line:
+                break
+            cmd = line.decode().strip()
+            self.received.append(cmd)
+            if cmd in self.no_prompt:
+                f.write(f"{self.answer(cmd)}\r\n".encode())
+            else:
+                f.write(f"{self.answer(cmd)}\r\n>>> ".encode())
+
+
+def test_query_many_answers_in_order():
+    fw = FakeFirmware()
+    with pcb(fw.address, timeout=2) as p:
+        assert p.query_many(["l1", "r2", "l3"]) == ["100", "200", "300"]
+        assert p.query("v") == "1.2.3"
+
+
+def test_query_many_empty_batch_sends_nothing():
+    fw = FakeFirmware()
+    with pcb(fw.address, timeout=2) as p:
+        sent_before = len(fw.received)
+        assert p.query_many([]) == []
+        assert p.query("l2") == "200"  # would read a stale prompt if anything had been sent
+        assert fw.received[sent_before:] == ["l2"]
+
+
+def test_query_many_missing_ack_does_not_desync_later_queries():
+    fw = FakeFirmware(no_prompt=["x"])
+    with pcb(fw.address, timeout=0.5) as p:
+        with pytest.raises(ValueError):
+            p.query_many(["l1", "x", "l2"])
+        assert p.query("v") == "1.2.3"
+        assert p.query_many(["r3", "l1"]) == ["300", "100"]
+
+
+def test_virt_query_many_matches_query():
+    p = virt.pcb()
+    p.prepare_virt_motion(spm=6400, el=[100, 100, 100])
+    cmds = ["l1", "r1", "l2", "r2", "l3", "r3"]
+    assert p.query_many(cmds) == [p.query(cmd) for cmd in cmds]
+
+
+class RejectingPcb(virt.pcb):
+    """Virtual pcb whose firmware refuses gotos on one axis."""
+
+    def __init__(self, reject_ax):
+        self.reject_ax = reject_ax
+        self.sent = []
+
+    def query(self, cmd):
+        self.sent.append(cmd)
+        if cmd.startswith(f"g{self.reject_ax}"):
+            return "ERROR 101"
+        return super().query(cmd)
+
+
+def test_rejected_goto_leaves_other_axes_homed():
+    p = RejectingPcb(reject_ax="2")
+    p.prepare_virt_motion(spm=6400, el=[100, 100, 100])
+    me = us(p, spm=6400)
+    me.connect()
+    with pytest.raises(ValueError):
+        me.goto([50, 50, 50])
+    assert not any(cmd.startswith("b") for cmd in p.sent)  # no e-stop to cancel the move
+    assert not any(cmd.startswith("g3") for cmd in p.sent)  # nothing started after the rejection
+    assert all(length > 0 for length in p.ml)  # so nothing got un-homed
+
+
+def test_parse_address():
+    scheme, location, settings = _parse_address("us://controller?el=100,200&spm=6400&kz=[[],[10,20]]&hto=30")
+    settings = dict(settings)
+    assert (scheme, location) == ("us", "controller")
+    assert settings["expected_lengths"].tolist() == [100, 200]
+    assert settings["keepout_zones"].tolist() == [[-2, -2], [10, 20]]
+    assert settings["steps_per_mm"] == 6400
+    assert settings["home_timeout"] == 30
+    assert settings["expected_lengths"].flags.writeable == False  # cached, so it must not be mutable
+
+
+@pytest.mark.parametrize("address", ["controller", "us://controller?kz=[[1,2", "us://controller?kz=[[1,2,3]]"])
+def test_parse_address_rejects_malformed(address):
+    with pytest.raises(ValueError):
+        _parse_address(address)
+
+
+@pytest.fixture
+def mo():
+    p = virt.pcb()
+    mo = motion("us://controller?el=100,100&spm=6400&kz=[[],[40,60]]", pcb_object=p)
+    mo.connect()
+    return mo
+
+
+def test_check_goal_accepts_reachable_goal(mo):
+    assert mo._check_goal([50, 30]) == [50, 30]
+
+
+@pytest.mark.parametrize(
+    "goal, message",
+    [([50, 50], "keepout"), ([1, 30], "Minimum"), ([99, 30], "Maximum"), ([50], "axis count mismatch")],
+)
+def test_check_goal_rejects(mo, goal, message):
+    with pytest.raises(ValueError, match=message):
+        mo._check_goal(goal)
+
+
+SAMPLE_PREFS = """\
+[PREFERENCES]
+; saved by an older version
+Scan_Points = 101
+mppt_params=basic://7:10
+  # indented comment
+diode_calibration_values   =   [1, 1]
+empty =
+
+[ARCHIVE]
+address : ftp://epozz:21/drop/
+"""
+
+
+def test_prefs_round_trip(tmp_path):
+    pytest.importorskip("appdirs")
+    pytest.importorskip("central_control")  # cli.py still imports the package by its old name
+    from centralcontrol import cli
+
+    path = tmp_path / "prefs.ini"
+    path.write_text(SAMPLE_PREFS)
+    prefs = cli._fast_read_prefs(path)
+
+    reference = configparser.ConfigParser()
+    reference.read(path)
+    assert prefs == {s: dict(reference[s]) for s in reference.sections()}
+
+    out = tmp_path / "out.ini"
+    cli._fast_write_prefs(out, prefs)
+    assert cli._fast_read_prefs(out) == prefs
+    assert cli._fast_read_prefs(tmp_path / "missing.ini") == {}